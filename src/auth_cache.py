@@ -0,0 +1,107 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Percaya klaim di token (sub, uid, role) tanpa membaca tabel users sama sekali.
+# Perubahan role/is_active baru berlaku setelah token kedaluwarsa.
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() == "true"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """User yang sudah terautentikasi; cukup untuk RBAC dan respons /auth/me."""
+    id: uuid.UUID
+    username: str
+    role: str
+    is_active: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            is_active=user.is_active is not False,
+            token_version=user.token_version or 0,
+        )
+
+
+class PrincipalCache:
+    """Cache principal per username dengan TTL pendek.
+
+    Entry hanya dipakai bila `ver` di token sama dengan token_version user yang
+    di-cache; admin yang mengubah/menghapus user memanggil `invalidate`.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Principal, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username: str, token_version: int) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(username, None)
+                self.misses += 1
+                return None
+            principal = entry[0]
+            if principal.token_version != token_version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return principal
+
+    def put(self, principal: Principal):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[principal.username] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *usernames: str):
+        with self._lock:
+            for username in usernames:
+                if self._entries.pop(username, None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "stateless": AUTH_STATELESS,
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+def principal_from_claims(payload: dict) -> Principal | None:
+    """Principal dari klaim token saja (mode AUTH_STATELESS); None untuk token lama tanpa uid."""
+    try:
+        return Principal(
+            id=uuid.UUID(payload["uid"]),
+            username=payload["sub"],
+            role=payload["role"],
+            is_active=True,
+            token_version=int(payload.get("ver", 0)),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,631 @@
+"""Benchmark sederhana untuk jalur-jalur yang sensitif performa.
+
+Jalankan dari root project, misalnya:
+
+    python -m src.benchmark ingest --chunks 2000 --latency 0.05 --db-latency 0.005
+    python -m src.benchmark vector-index --index hnsw --rows 20000
+    python -m src.benchmark db-throughput --requests 2000 --concurrency 50
+    python -m src.benchmark retrieval --chunks 2000 --queries 100
+    python -m src.benchmark stream-load --streams 50 --pool-size 5
+    python -m src.benchmark auth --requests 5000 --concurrency 100
+    python -m src.benchmark login-storm --logins 200 --chats 200
+    python -m src.benchmark pdf-extract --pages 400 --workers 1 2 4
+"""
+import os
+import time
+import asyncio
+import argparse
+
+# Modul database membuat engine saat import; benchmark yang tidak butuh DB
+# cukup memakai URL dummy (koneksi baru dibuka saat query pertama).
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/benchmark")
+# Benchmark memakai embedder lokal deterministik kecuali diminta lain
+os.environ.setdefault("EMBEDDING_BACKEND", "hash")
+
+
+def _synthetic_texts(count: int, length: int = 900) -> list[str]:
+    base = "Manual perawatan unit {i}: periksa tekanan, ganti filter, catat kode part P-{i:05d}. "
+    texts = []
+    for i in range(count):
+        sentence = base.format(i=i)
+        texts.append((sentence * (length // len(sentence) + 1))[:length])
+    return texts
+
+
+# --- ingest: pipeline embedding dokumen ---
+async def _bench_ingest(args):
+    import uuid
+    from . import database as db, ingestion
+    from .embedding_client import AsyncEmbeddingClient, HashEmbeddingBackend
+
+    texts = _synthetic_texts(args.chunks)
+    backend = HashEmbeddingBackend(latency=args.latency)
+    embedder = AsyncEmbeddingClient(backend, concurrency=args.concurrency)
+
+    serial_count = min(args.chunks, args.serial_sample)
+    start = time.perf_counter()
+    for text in texts[:serial_count]:
+        backend.embed_query(text)
+    serial_elapsed = time.perf_counter() - start
+    print(f"serial   : {serial_count / serial_elapsed:8.1f} chunks/s ({serial_count} chunks, 1 request/chunk)")
+
+    start = time.perf_counter()
+    vectors = await ingestion.embed_texts(
+        texts, embedder, batch_size=args.batch_size, concurrency=args.concurrency
+    )
+    elapsed = time.perf_counter() - start
+    assert len(vectors) == len(texts)
+    print(
+        f"pipeline : {len(texts) / elapsed:8.1f} chunks/s ({len(texts)} chunks, "
+        f"batch={args.batch_size}, concurrency={args.concurrency})"
+    )
+
+    # End-to-end: ingest_pages (chunk -> embed per window -> bulk insert) dengan session palsu
+    session = _RecordingSession(latency=args.db_latency)
+    document = db.Document(id=uuid.uuid4(), title="benchmark")
+
+    async def pages():
+        for page_num, text in enumerate(texts, 1):
+            yield page_num, text
+
+    start = time.perf_counter()
+    result = await ingestion.ingest_pages(session, document, pages(), embedder, _PageSplitter())
+    elapsed = time.perf_counter() - start
+    rows = sum(session.batches)
+    assert result.chunks == rows == len(texts), (result.chunks, rows)
+    assert all(row["document_id"] == document.id for row in session.rows)
+    print(
+        f"ingest   : {len(texts) / elapsed:8.1f} chunks/s ({rows} rows dalam {len(session.batches)} "
+        f"executemany, maks {max(session.batches, default=0)} rows/batch)"
+    )
+    embedder.shutdown()
+
+
+class _PageSplitter:
+    # Satu halaman sintetis = satu chunk; yang diukur embed + insert, bukan splitting
+    def split_text(self, text: str) -> list[str]:
+        return [text]
+
+
+class _RecordingSession:
+    """Pengganti AsyncSession untuk ingest_pages: mencatat batch executemany
+    dan mensimulasikan satu round-trip DB per `execute`."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.batches: list[int] = []
+        self.rows: list[dict] = []
+
+    async def execute(self, statement, params=None):
+        rows = params if isinstance(params, list) else [params or {}]
+        self.batches.append(len(rows))
+        self.rows.extend(rows)
+        await asyncio.sleep(self.latency)
+
+
+# --- vector-index: recall vs latency index ANN pgvector ---
+def _vector_literal(vector) -> str:
+    return "[" + ",".join(f"{v:.6f}" for v in vector) + "]"
+
+
+async def _bench_vector_index(args):
+    import random
+    import statistics
+    from sqlalchemy import text
+    from . import database as db
+
+    rng = random.Random(42)
+
+    def random_vector():
+        return [rng.gauss(0.0, 1.0) for _ in range(args.dim)]
+
+    corpus = [random_vector() for _ in range(args.rows)]
+    queries = [random_vector() for _ in range(args.queries)]
+    if args.index == "hnsw":
+        index_sql = (
+            "CREATE INDEX bench_vectors_idx ON bench_vectors USING hnsw "
+            f"(embedding vector_l2_ops) WITH (m = {db.HNSW_M}, ef_construction = {db.HNSW_EF_CONSTRUCTION})"
+        )
+        knob = "hnsw.ef_search"
+    else:
+        index_sql = (
+            "CREATE INDEX bench_vectors_idx ON bench_vectors USING ivfflat "
+            f"(embedding vector_l2_ops) WITH (lists = {args.lists})"
+        )
+        knob = "ivfflat.probes"
+    search_sql = text(
+        "SELECT id FROM bench_vectors ORDER BY embedding <-> CAST(:q AS vector) LIMIT :k"
+    )
+
+    async with db.engine.connect() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.execute(
+            text(f"CREATE TEMP TABLE bench_vectors (id integer PRIMARY KEY, embedding vector({args.dim}))")
+        )
+        rows = [{"id": i, "v": _vector_literal(v)} for i, v in enumerate(corpus)]
+        for i in range(0, len(rows), 1000):
+            await conn.execute(
+                text("INSERT INTO bench_vectors VALUES (:id, CAST(:v AS vector))"), rows[i:i + 1000]
+            )
+        await conn.execute(text("ANALYZE bench_vectors"))
+
+        async def run():
+            latencies, ids = [], []
+            for q in queries:
+                start = time.perf_counter()
+                result = await conn.execute(search_sql, {"q": _vector_literal(q), "k": args.k})
+                latencies.append((time.perf_counter() - start) * 1000)
+                ids.append({row[0] for row in result.all()})
+            return ids, latencies
+
+        exact, exact_lat = await run()
+        print(f"{'mode':<22}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+        print(f"{'seq scan (exact)':<22}{1.0:>10.3f}{statistics.median(exact_lat):>10.2f}"
+              f"{statistics.quantiles(exact_lat, n=20)[18]:>10.2f}")
+
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+        start = time.perf_counter()
+        await conn.execute(text(index_sql))
+        print(f"index build: {time.perf_counter() - start:.1f}s ({args.index})")
+
+        for value in args.search_values:
+            await conn.execute(text(f"SET {knob} = {int(value)}"))
+            found, lat = await run()
+            recall = statistics.mean(len(f & e) / args.k for f, e in zip(found, exact))
+            print(f"{knob + '=' + str(value):<22}{recall:>10.3f}{statistics.median(lat):>10.2f}"
+                  f"{statistics.quantiles(lat, n=20)[18]:>10.2f}")
+        await conn.rollback()
+
+
+# --- db-throughput: konfigurasi engine lama (echo, pool default) vs env ---
+async def _bench_db_throughput(args):
+    import random
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from . import database as db
+
+    rng = random.Random(7)
+    vector = _vector_literal([rng.gauss(0.0, 1.0) for _ in range(768)])
+    # Bentuk query mirip satu turn chat: baca ringan + query dengan literal vektor
+    light_sql = text("SELECT now(), :user_id")
+    vector_sql = text("SELECT CAST(:v AS vector) <-> CAST(:q AS vector)")
+
+    async def run(engine):
+        factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one_request(i):
+            async with semaphore:
+                async with factory() as session:
+                    await session.execute(light_sql, {"user_id": f"user-{i}"})
+                    await session.execute(vector_sql, {"v": vector, "q": vector})
+
+        async with engine.connect() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            await conn.commit()
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        await engine.dispose()
+        return args.requests / elapsed
+
+    results = {}
+    # Engine seperti sebelumnya: echo=True dan pool default (5 + 10 overflow)
+    results["before (echo, default pool)"] = await run(
+        create_async_engine(db.DATABASE_URL, echo=True)
+    )
+    results["after (env config)"] = await run(
+        create_async_engine(db.database_url(), **db.engine_options())
+    )
+    print()
+    pool_size, max_overflow = db.pool_limits()
+    print(f"pool_size={pool_size} max_overflow={max_overflow} statement_cache={db.DB_STATEMENT_CACHE_SIZE}")
+    for label, rate in results.items():
+        print(f"{label:<30}{rate:10.1f} req/s ({args.requests} requests, concurrency={args.concurrency})")
+
+
+# --- retrieval: vector vs lexical vs hybrid pada korpus fixture ---
+async def _bench_retrieval(args):
+    import random
+    import statistics
+    from sqlalchemy import insert
+    from . import database as db, ingestion, retrieval
+    from .embedding_client import embedding_service
+
+    texts = _synthetic_texts(args.chunks)
+    rng = random.Random(11)
+    targets = rng.sample(range(args.chunks), min(args.queries, args.chunks))
+    # Pertanyaan menyebut kode part; jawaban benar adalah chunk yang memuat kode itu
+    questions = [(f"Bagaimana jadwal ganti filter untuk kode part P-{i:05d}?", f"P-{i:05d}") for i in targets]
+
+    async with db.async_session() as session:
+        # Semua data fixture hanya hidup di transaksi ini (di-rollback di akhir)
+        user = db.User(username=f"bench-{rng.random()}", password_hash="x", role="admin")
+        session.add(user)
+        await session.flush()
+        document = db.Document(filename="bench.pdf", file_path="/tmp/bench.pdf", uploaded_by=user.id)
+        session.add(document)
+        await session.flush()
+        vectors = await ingestion.embed_texts(texts, embedding_service)
+        await session.execute(
+            insert(db.DocumentChunk),
+            [
+                {"document_id": document.id, "chunk_index": f"page_1_chunk_{i}", "content": text,
+                 "content_embedding": vector, "page_number": "1"}
+                for i, (text, vector) in enumerate(zip(texts, vectors))
+            ],
+        )
+        query_vectors = {q: await embedding_service.embed_query(q) for q, _ in questions}
+
+        print(f"{'mode':<10}{'hit@' + str(args.k):>8}{'p50 ms':>10}{'p95 ms':>10}")
+        for mode in ("vector", "lexical", "hybrid"):
+            latencies, hits = [], 0
+            for question, code in questions:
+                start = time.perf_counter()
+                chunks = await retrieval.hybrid_search_chunks(
+                    session, question, limit=args.k, mode=mode,
+                    query_embedding=query_vectors[question],
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += any(code in chunk.content for chunk in chunks)
+            print(f"{mode:<10}{hits / len(questions):>8.3f}{statistics.median(latencies):>10.2f}"
+                  f"{statistics.quantiles(latencies, n=20)[18]:>10.2f}")
+        await session.rollback()
+    embedding_service.shutdown()
+
+
+# --- stream-load: stream chat serentak melebihi ukuran pool DB ---
+class _FakeStreamingLLM:
+    """Pengganti LLM streaming: `tokens` potongan teks dengan jeda `delay` detik."""
+
+    def __init__(self, tokens: int, delay: float):
+        self.tokens = tokens
+        self.delay = delay
+
+    async def astream(self, messages):
+        from types import SimpleNamespace
+
+        for i in range(self.tokens):
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(content=f"token{i} ", usage_metadata=None)
+
+
+async def _bench_stream_load(args):
+    # Pool kecil dan timeout pendek agar kehabisan koneksi langsung terlihat sebagai error
+    os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+    os.environ["DB_POOL_TIMEOUT"] = str(args.pool_timeout)
+    os.environ.setdefault("DIGEST_ENABLED", "false")
+    from sqlalchemy import delete
+    from . import database as db, schemas, services
+    from .tasks import task_supervisor
+
+    await task_supervisor.start()
+    services.llm = _FakeStreamingLLM(args.tokens, args.token_delay)
+    user_id = f"bench-stream-{time.time_ns()}"
+    async with db.async_session() as session:
+        # Percakapan sudah berjudul: tidak memicu pembuatan judul (panggilan LLM sungguhan)
+        conversations = [db.Conversation(user_id=user_id, summary="Benchmark") for _ in range(args.streams)]
+        session.add_all(conversations)
+        await session.commit()
+
+    generating = peak_generating = peak_checked_out = 0
+    errors: list[str] = []
+
+    async def one_stream(conversation, pinned: bool):
+        nonlocal generating, peak_generating, peak_checked_out
+        request = schemas.ChatRequest(user_id=user_id, message="Berapa interval ganti filter?",
+                                      conversation_id=conversation.id)
+        conn = await db.engine.connect() if pinned else None
+        try:
+            counted = False
+            async for event, data in services.chat_stream_events(request):
+                if event == "token" and not counted:
+                    counted = True
+                    generating += 1
+                    peak_generating = max(peak_generating, generating)
+                elif event == "error":
+                    errors.append(data["message"])
+                peak_checked_out = max(peak_checked_out, db.engine.pool.checkedout())
+            if counted:
+                generating -= 1
+        except Exception as e:
+            errors.append(type(e).__name__)
+        finally:
+            if conn is not None:
+                await conn.close()
+
+    print(f"pool_size={args.pool_size} max_overflow=0 streams={args.streams} "
+          f"generation≈{args.tokens * args.token_delay:.1f}s")
+    print(f"{'mode':<26}{'peak streams':>14}{'peak conns':>12}{'errors':>8}{'wall s':>9}")
+    modes = [("scoped sessions", False)]
+    if args.compare_pinned:
+        # Simulasi perilaku lama: satu koneksi dipegang selama seluruh stream
+        modes.insert(0, ("pinned connection", True))
+    for label, pinned in modes:
+        generating = peak_generating = peak_checked_out = 0
+        errors.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one_stream(c, pinned) for c in conversations))
+        elapsed = time.perf_counter() - start
+        print(f"{label:<26}{peak_generating:>14}{peak_checked_out:>12}{len(errors):>8}{elapsed:>9.2f}")
+
+    # Tunggu embedding memory di background sebelum fixture dibersihkan
+    await task_supervisor.stop()
+    await services.memory_buffer.flush()
+    async with db.async_session() as session:
+        ids = [c.id for c in conversations]
+        await session.execute(delete(db.MemoryEmbedding).where(db.MemoryEmbedding.conversation_id.in_(ids)))
+        await session.execute(delete(db.Message).where(db.Message.conversation_id.in_(ids)))
+        await session.execute(delete(db.Conversation).where(db.Conversation.id.in_(ids)))
+        await session.commit()
+    services.embedding_service.shutdown()
+
+
+# --- auth: resolusi user per request (DB tiap request vs cache vs stateless) ---
+async def _bench_auth(args):
+    import statistics
+    from sqlalchemy import delete
+    from jose import jwt
+    from . import database as db, services
+    from .auth_cache import PrincipalCache
+
+    async with db.async_session() as session:
+        user = db.User(username=f"bench-auth-{time.time_ns()}", password_hash="x", role="admin")
+        session.add(user)
+        await session.commit()
+    token = services.create_access_token(services.access_token_claims(user))
+
+    async def run(label, cache: PrincipalCache, stateless: bool):
+        services.principal_cache = cache
+        services.AUTH_STATELESS = stateless
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async def one_request():
+            async with semaphore:
+                start = time.perf_counter()
+                # Sama seperti get_current_user: decode JWT lalu resolve principal
+                async with db.async_session() as session:
+                    payload = jwt.decode(token, services.SECRET_KEY, algorithms=[services.ALGORITHM])
+                    principal = await services.resolve_principal(session, payload)
+                assert principal is not None
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        print(f"{label:<12}{args.requests / elapsed:>10.1f}{statistics.median(latencies):>10.3f}"
+              f"{statistics.quantiles(latencies, n=100)[98]:>10.3f}")
+
+    print(f"{'mode':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}  (concurrency={args.concurrency})")
+    await run("db", PrincipalCache(ttl=0), stateless=False)
+    await run("cache", PrincipalCache(), stateless=False)
+    await run("stateless", PrincipalCache(ttl=0), stateless=True)
+
+    async with db.async_session() as session:
+        await session.execute(delete(db.User).where(db.User.id == user.id))
+        await session.commit()
+
+
+# --- login-storm: latensi chat saat banyak login bersamaan (bcrypt inline vs pool) ---
+async def _bench_login_storm(args):
+    import statistics
+    from .database import pwd_context, BCRYPT_ROUNDS
+    from .passwords import PasswordHasher
+
+    password = "benchmark-password"
+    password_hash = pwd_context.hash(password)
+    # Ideal satu "chat": --chat-steps jeda async (mis. token dari LLM), tanpa kerja CPU
+    ideal_ms = args.chat_steps * args.chat_step_delay * 1000
+
+    async def chat():
+        start = time.perf_counter()
+        for _ in range(args.chat_steps):
+            await asyncio.sleep(args.chat_step_delay)
+        return (time.perf_counter() - start) * 1000
+
+    async def run(label, verify):
+        async def login():
+            assert await verify(password, password_hash)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(login() for _ in range(args.logins)),
+            *(chat() for _ in range(args.chats)),
+        )
+        elapsed = time.perf_counter() - start
+        latencies = [value for value in results if value is not None]
+        print(f"{label:<18}{statistics.median(latencies):>10.1f}{statistics.quantiles(latencies, n=100)[98]:>10.1f}"
+              f"{args.logins / elapsed:>12.1f}")
+
+    async def inline_verify(plain, hashed):
+        # Perilaku lama: bcrypt langsung di event loop
+        return pwd_context.verify(plain, hashed)
+
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, logins={args.logins}, chats={args.chats}, ideal chat={ideal_ms:.0f} ms")
+    print(f"{'mode':<18}{'chat p50':>10}{'chat p99':>10}{'logins/s':>12}")
+    await run("inline", inline_verify)
+    for kind in args.executors:
+        hasher = PasswordHasher(workers=args.workers, executor=kind)
+
+        async def pooled_verify(plain, hashed):
+            valid, _ = await hasher.verify_and_update(plain, hashed)
+            return valid
+
+        await run(f"{kind} pool", pooled_verify)
+        hasher.shutdown()
+
+
+# --- pdf-extract: ekstraksi teks serial vs process pool per rentang halaman ---
+def _write_fixture_pdf(path: str, pages: int, lines: int = 45):
+    from pypdf import PdfWriter
+    from pypdf.generic import (
+        ContentStream, DecodedStreamObject, DictionaryObject, NameObject,
+    )
+
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    texts = _synthetic_texts(pages * lines, length=90)
+    for page_index in range(pages):
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        body = ["BT", "/F1 9 Tf", "11 TL", "40 760 Td"]
+        for line in texts[page_index * lines:(page_index + 1) * lines]:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            body.append(f"({escaped}) Tj T*")
+        body.append("ET")
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(body).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(ContentStream(stream, writer))
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+async def _bench_pdf_extract(args):
+    import tempfile
+    from pypdf import PdfReader
+    from .pdf_extract import PdfExtractor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixture.pdf")
+        start = time.perf_counter()
+        _write_fixture_pdf(path, args.pages)
+        print(f"fixture: {args.pages} halaman, {os.path.getsize(path) / 1e6:.1f} MB "
+              f"({time.perf_counter() - start:.1f}s)")
+
+        # Loop event harus tetap responsif selama ekstraksi: ukur jeda terbesarnya
+        async def measure(label, pages_iter):
+            stalls = []
+            done = asyncio.Event()
+
+            async def heartbeat():
+                while not done.is_set():
+                    tick = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    stalls.append((time.perf_counter() - tick - 0.01) * 1000)
+
+            monitor = asyncio.create_task(heartbeat())
+            await asyncio.sleep(0)
+            start = time.perf_counter()
+            chars = 0
+            async for _, text in pages_iter:
+                chars += len(text)
+            elapsed = time.perf_counter() - start
+            done.set()
+            await monitor
+            print(f"{label:<16}{args.pages / elapsed:>10.1f}{elapsed:>9.2f}{max(stalls, default=0):>14.1f}{chars:>12}")
+
+        async def serial_pages():
+            # Perilaku lama: pypdf langsung di coroutine
+            for page_num, page in enumerate(PdfReader(path).pages, 1):
+                yield page_num, page.extract_text() or ""
+
+        print(f"{'mode':<16}{'pages/s':>10}{'total s':>9}{'max stall ms':>14}{'chars':>12}")
+        await measure("serial", serial_pages())
+        for workers in args.workers:
+            extractor = PdfExtractor(workers=workers, pages_per_task=args.pages_per_task)
+            await measure(f"pool x{workers}", extractor.extract_pages(path))
+            extractor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser(
+        "ingest", help="Throughput embedding dan ingest_pages end-to-end (session DB palsu)"
+    )
+    ingest.add_argument("--chunks", type=int, default=2000)
+    ingest.add_argument("--latency", type=float, default=0.05, help="Latensi simulasi per request (detik)")
+    ingest.add_argument("--batch-size", type=int, default=32)
+    ingest.add_argument("--concurrency", type=int, default=4)
+    ingest.add_argument("--serial-sample", type=int, default=100)
+    ingest.add_argument("--db-latency", type=float, default=0.005, help="Latensi simulasi per executemany (detik)")
+    ingest.set_defaults(func=_bench_ingest)
+
+    vector_index = subparsers.add_parser(
+        "vector-index", help="Recall vs latency index ANN pada korpus sintetis (butuh DATABASE_URL)"
+    )
+    vector_index.add_argument("--index", choices=["hnsw", "ivfflat"], default="hnsw")
+    vector_index.add_argument("--rows", type=int, default=20000)
+    vector_index.add_argument("--dim", type=int, default=768)
+    vector_index.add_argument("--queries", type=int, default=100)
+    vector_index.add_argument("--k", type=int, default=5)
+    vector_index.add_argument("--lists", type=int, default=100)
+    vector_index.add_argument(
+        "--search-values", type=int, nargs="+", default=[10, 20, 40, 80, 160],
+        help="Nilai ef_search (hnsw) atau probes (ivfflat) yang diuji",
+    )
+    vector_index.set_defaults(func=_bench_vector_index)
+
+    db_throughput = subparsers.add_parser(
+        "db-throughput", help="Throughput query sebelum/sesudah konfigurasi pool & echo (butuh DATABASE_URL)"
+    )
+    db_throughput.add_argument("--requests", type=int, default=2000)
+    db_throughput.add_argument("--concurrency", type=int, default=50)
+    db_throughput.set_defaults(func=_bench_db_throughput)
+
+    retrieval = subparsers.add_parser(
+        "retrieval",
+        help="Hit rate & latensi retrieval vector/lexical/hybrid pada korpus kode part (butuh DB hasil migrasi)",
+    )
+    retrieval.add_argument("--chunks", type=int, default=2000)
+    retrieval.add_argument("--queries", type=int, default=100)
+    retrieval.add_argument("--k", type=int, default=3)
+    retrieval.set_defaults(func=_bench_retrieval)
+
+    stream_load = subparsers.add_parser(
+        "stream-load",
+        help="Stream chat serentak vs ukuran pool DB, dengan LLM palsu (butuh DB hasil migrasi)",
+    )
+    stream_load.add_argument("--streams", type=int, default=50)
+    stream_load.add_argument("--pool-size", type=int, default=5)
+    stream_load.add_argument("--pool-timeout", type=float, default=5)
+    stream_load.add_argument("--tokens", type=int, default=40)
+    stream_load.add_argument("--token-delay", type=float, default=0.05)
+    stream_load.add_argument(
+        "--compare-pinned", action="store_true",
+        help="Jalankan juga mode lama (koneksi dipegang selama stream) sebagai pembanding",
+    )
+    stream_load.set_defaults(func=_bench_stream_load)
+
+    auth = subparsers.add_parser(
+        "auth", help="Latensi resolusi user: DB per request vs principal cache vs stateless (butuh DB)"
+    )
+    auth.add_argument("--requests", type=int, default=5000)
+    auth.add_argument("--concurrency", type=int, default=100)
+    auth.set_defaults(func=_bench_auth)
+
+    login_storm = subparsers.add_parser(
+        "login-storm", help="Latensi chat (p50/p99) saat lonjakan login: bcrypt inline vs pool worker"
+    )
+    login_storm.add_argument("--logins", type=int, default=200)
+    login_storm.add_argument("--chats", type=int, default=200)
+    login_storm.add_argument("--chat-steps", type=int, default=20)
+    login_storm.add_argument("--chat-step-delay", type=float, default=0.01)
+    login_storm.add_argument("--workers", type=int, default=4)
+    login_storm.add_argument("--executors", nargs="+", choices=["thread", "process"], default=["thread", "process"])
+    login_storm.set_defaults(func=_bench_login_storm)
+
+    pdf_extract = subparsers.add_parser(
+        "pdf-extract", help="Ekstraksi teks PDF sintetis: serial vs process pool per rentang halaman"
+    )
+    pdf_extract.add_argument("--pages", type=int, default=400)
+    pdf_extract.add_argument("--pages-per-task", type=int, default=16)
+    pdf_extract.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    pdf_extract.set_defaults(func=_bench_pdf_extract)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import re
+from dataclasses import dataclass, field
+
+# Total token untuk bagian prompt yang berubah-ubah (dokumen, memori, history, pesan)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+# Batas per bagian; sisa yang tidak terpakai dialihkan ke history
+DOCUMENT_TOKEN_BUDGET = int(os.getenv("DOCUMENT_TOKEN_BUDGET", "1200"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "300"))
+DIGEST_TOKEN_BUDGET = int(os.getenv("DIGEST_TOKEN_BUDGET", "400"))
+# Jumlah pesan history yang diambil dari DB (chat biasa dan streaming sama)
+HISTORY_FETCH_LIMIT = int(os.getenv("HISTORY_FETCH_LIMIT", "20"))
+# Pesan lama yang lebih panjang dari ini dipotong; pesan terbaru dipertahankan utuh
+HISTORY_MESSAGE_TOKEN_LIMIT = int(os.getenv("HISTORY_MESSAGE_TOKEN_LIMIT", "300"))
+HISTORY_RECENT_FULL = 2
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Perkiraan token lokal tanpa tokenizer model: ~4 karakter per token, minimal
+    satu token per kata/tanda baca. Cukup akurat untuk budgeting."""
+    if not text:
+        return 0
+    return max(len(text) // 4, len(_TOKEN_RE.findall(text)))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Potong per karakter lalu rapikan di batas kata
+    cut = text[: max_tokens * 4]
+    while cut and estimate_tokens(cut) > max_tokens:
+        cut = cut[: int(len(cut) * 0.9)]
+    return cut.rsplit(" ", 1)[0] + " …"
+
+
+@dataclass
+class PromptContext:
+    document_context: str
+    memories_text: str
+    chat_history: str
+    user_message: str
+    tokens: dict[str, int] = field(default_factory=dict)
+    history_kept: int = 0
+    history_total: int = 0
+
+    def inputs(self) -> dict:
+        return {
+            "document_context": self.document_context,
+            "memories_text": self.memories_text,
+            "chat_history": self.chat_history,
+            "user_message": self.user_message,
+        }
+
+    def log(self, label: str = "PROMPT"):
+        print(
+            f"🧮 {label}: ≈{self.tokens.get('total', 0)} tokens {self.tokens} "
+            f"history {self.history_kept}/{self.history_total} pesan"
+        )
+
+
+def _fit_lines(lines: list[str], budget: int, truncate_first: bool = False) -> tuple[list[str], int]:
+    # Baris yang tidak muat dilewati, baris berikutnya yang lebih pendek masih bisa masuk
+    kept, used = [], 0
+    for index, line in enumerate(lines):
+        tokens = estimate_tokens(line)
+        if used + tokens > budget:
+            # Chunk teratas selalu dipertahankan rerank: potong, jangan dibuang
+            if not (truncate_first and index == 0 and budget > 0):
+                continue
+            line = truncate_to_tokens(line, budget)
+            tokens = estimate_tokens(line)
+        kept.append(line)
+        used += tokens
+    return kept, used
+
+
+def build_rag_context(
+    history: list,
+    memories: list[str],
+    document_chunks: list[str],
+    user_message: str,
+    exclude_message_id=None,
+    fixed_tokens: int = 0,
+    budget: int = PROMPT_TOKEN_BUDGET,
+    digest: str | None = None,
+) -> PromptContext:
+    """Susun input rag_chat_prompt dalam batas token.
+
+    Urutan prioritas: pesan user, chunk dokumen, memori, digest percakapan, lalu
+    history dari yang terbaru. Pesan history lama dipotong; yang tidak muat
+    dibuang dan diganti satu baris penanda. `fixed_tokens` adalah ukuran
+    template/system prompt.
+    """
+    remaining = budget - estimate_tokens(user_message)
+
+    doc_lines, doc_tokens = _fit_lines(
+        [f"- {chunk}" for chunk in document_chunks], min(DOCUMENT_TOKEN_BUDGET, max(remaining, 0)),
+        truncate_first=True,
+    )
+    remaining -= doc_tokens
+    document_context = (
+        "Informasi relevan dari dokumen:\n" + "\n".join(doc_lines) if doc_lines else ""
+    )
+
+    memory_lines, memory_tokens = _fit_lines(
+        [f"- {memory}" for memory in memories], min(MEMORY_TOKEN_BUDGET, max(remaining, 0))
+    )
+    remaining -= memory_tokens
+    memories_text = (
+        "Ingat percakapan relevan ini dari masa lalu:\n" + "\n".join(memory_lines)
+        if memory_lines else ""
+    )
+
+    digest_line = ""
+    if digest and remaining > 0:
+        digest_line = "Ringkasan percakapan sebelumnya: " + truncate_to_tokens(
+            digest, min(DIGEST_TOKEN_BUDGET, remaining)
+        )
+    digest_tokens = estimate_tokens(digest_line)
+    remaining -= digest_tokens
+
+    # Pesan user turn ini sudah tersimpan (dan ikut terambil); jangan dikirim dua kali
+    turns = [msg for msg in history if exclude_message_id is None or msg.id != exclude_message_id]
+    kept_lines, history_tokens = [], 0
+    for position, msg in enumerate(reversed(turns)):
+        content = msg.content
+        if position >= HISTORY_RECENT_FULL:
+            content = truncate_to_tokens(content, HISTORY_MESSAGE_TOKEN_LIMIT)
+        line = f"{msg.sender_role}: {content}"
+        tokens = estimate_tokens(line)
+        if history_tokens + tokens > max(remaining, 0):
+            break
+        kept_lines.append(line)
+        history_tokens += tokens
+    kept_lines.reverse()
+    dropped = len(turns) - len(kept_lines)
+    if dropped:
+        kept_lines.insert(0, f"({dropped} pesan sebelumnya tidak ditampilkan)")
+    if digest_line:
+        kept_lines.insert(0, digest_line)
+    chat_history = "\n".join(kept_lines)
+
+    tokens = {
+        "fixed": fixed_tokens,
+        "documents": doc_tokens,
+        "memories": memory_tokens,
+        "digest": digest_tokens,
+        "history": history_tokens,
+        "user": estimate_tokens(user_message),
+    }
+    tokens["total"] = sum(tokens.values())
+    return PromptContext(
+        document_context=document_context,
+        memories_text=memories_text,
+        chat_history=chat_history,
+        user_message=user_message,
+        tokens=tokens,
+        history_kept=len(turns) - dropped,
+        history_total=len(turns),
+    )
@@ -1,24 +1,179 @@
 import os
+import time
 import dotenv
 import uuid
+import logging
 from datetime import datetime
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Boolean
-from sqlalchemy.dialects.postgresql import UUID as pgUUID
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship, deferred
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Boolean, Integer, Index, Computed, text, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.dialects.postgresql import UUID as pgUUID, TSVECTOR
 from pgvector.sqlalchemy import Vector
 
 dotenv.load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# --- Konfigurasi koneksi ---
+# Echo mencetak setiap statement (termasuk literal vektor 768 float); hanya untuk debug
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+# Total koneksi ke Postgres = jumlah worker uvicorn x (pool_size + max_overflow)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Opsional: batas total koneksi untuk semua worker; pool tiap worker dibagi rata
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "0"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# statement_timeout di sisi server (ms); 0 = tanpa batas
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Cache prepared statement asyncpg; set 0 bila lewat pgbouncer mode transaction
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Query yang lebih lama dari ini (ms) dicatat ke log; 0 = nonaktif
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+logger = logging.getLogger(__name__)
+
+
+def pool_limits() -> tuple[int, int]:
+    """(pool_size, max_overflow) per proses, memperhitungkan DB_CONNECTION_BUDGET."""
+    if DB_CONNECTION_BUDGET <= 0:
+        return DB_POOL_SIZE, DB_MAX_OVERFLOW
+    per_worker = max(1, DB_CONNECTION_BUDGET // max(1, WEB_CONCURRENCY))
+    pool_size = min(DB_POOL_SIZE, per_worker)
+    return pool_size, max(0, per_worker - pool_size)
+
+
+def engine_options() -> dict:
+    """Argumen create_async_engine sesuai konfigurasi env di atas."""
+    pool_size, max_overflow = pool_limits()
+    server_settings = {"application_name": os.getenv("DB_APPLICATION_NAME", "chatbot-rag")}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+    return {
+        "echo": DB_ECHO,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {
+            "server_settings": server_settings,
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        },
+    }
+
+
+def database_url(url: str | None = DATABASE_URL):
+    """URL engine; cache prepared statement milik adapter SQLAlchemy ikut DB_STATEMENT_CACHE_SIZE."""
+    url = make_url(url)
+    return url.update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    )
+
+
+# Statistik query lambat untuk /api/admin/metrics
+query_stats = {"slow_queries": 0, "slowest_ms": 0.0}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    if elapsed_ms < DB_SLOW_QUERY_MS:
+        return
+    query_stats["slow_queries"] += 1
+    query_stats["slowest_ms"] = max(query_stats["slowest_ms"], round(elapsed_ms, 1))
+    # Parameter sengaja tidak dicatat (bisa berisi vektor atau data user)
+    logger.warning(
+        "slow_query duration_ms=%.1f executemany=%s statement=%r",
+        elapsed_ms, executemany, " ".join(statement.split())[:500],
+    )
+
+
+def install_slow_query_logging(target_engine):
+    if DB_SLOW_QUERY_MS > 0:
+        event.listen(target_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def pool_stats() -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+        **query_stats,
+    }
+
+
+# Cost bcrypt; hash dengan cost lain ditandai needs_update dan di-rehash saat login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+engine = create_async_engine(database_url(), **engine_options())
+install_slow_query_logging(engine)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
+# clock_timestamp() (bukan now()) supaya baris yang ditulis dalam satu transaksi
+# tetap punya urutan waktu yang benar
+SERVER_NOW = text("clock_timestamp()")
+
+# Tabel yang created_at-nya memakai server default (lihat migrations.py)
+SERVER_TIMESTAMP_TABLES = ("conversations", "messages", "memory_embeddings")
+
+# --- Vector index (pgvector ANN) ---
+# 'hnsw' (default), 'ivfflat', atau 'none' untuk tanpa index (sequential scan)
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+# Iterative index scan (pgvector >= 0.8) agar query dengan filter (user/percakapan,
+# dokumen aktif) tetap mendapat cukup hasil. Set 'false' untuk pgvector lama.
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "true").lower() == "true"
+
+
+def vector_index(name: str, column: str) -> tuple:
+    """Index ANN untuk kolom embedding. Query memakai l2_distance, jadi operator class-nya vector_l2_ops."""
+    if VECTOR_INDEX_TYPE == "none":
+        return ()
+    if VECTOR_INDEX_TYPE == "ivfflat":
+        params = {"lists": IVFFLAT_LISTS}
+    else:
+        params = {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    return (
+        Index(
+            name,
+            column,
+            postgresql_using="ivfflat" if VECTOR_INDEX_TYPE == "ivfflat" else "hnsw",
+            postgresql_with=params,
+            postgresql_ops={column: "vector_l2_ops"},
+        ),
+    )
+
+
+# --- Full-text search (retrieval leksikal) ---
+# 'simple': tanpa stemming/stopword bahasa tertentu, sehingga kode produk dan nomor
+# part (mis. P-00042) tetap utuh sebagai token
+FTS_CONFIG = os.getenv("FTS_CONFIG", "simple")
+CONTENT_TSV_EXPRESSION = f"to_tsvector('{FTS_CONFIG}'::regconfig, content)"
+
 
 # --- Model User ---
 class User(Base):
@@ -28,6 +183,8 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     role = Column(String, nullable=False, default="user")  # 'user' or 'admin'
     is_active = Column(Boolean, default=True)
+    # Dinaikkan saat kredensial/role/status berubah: token dengan `ver` lama ditolak
+    token_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
 
     def verify_password(self, password: str) -> bool:
         return pwd_context.verify(password, self.password_hash)
@@ -40,10 +197,20 @@ class User(Base):
 # --- Model Conversation ---
 class Conversation(Base):
     __tablename__ = "conversations"
+    # eager_defaults: nilai server default (created_at) diambil lewat RETURNING saat flush
+    __table_args__ = (
+        # Sidebar: percakapan milik user, terbaru dulu (keyset pada created_at, id)
+        Index("ix_conversations_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=SERVER_NOW)
     summary = Column(Text, nullable=True)
+    # Ringkasan berjalan: pesan s/d digest_through sudah dilipat ke digest
+    digest = Column(Text, nullable=True)
+    digest_through = Column(DateTime(timezone=True), nullable=True)
+    digest_message_count = Column(Integer, nullable=False, default=0, server_default="0")
     messages = relationship(
         "Message", back_populates="conversation", cascade="all, delete-orphan"
     )
@@ -52,20 +219,30 @@ class Conversation(Base):
 # --- Model Message ---
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # History chat & halaman pesan: per percakapan, diurutkan (created_at, id)
+        Index("ix_messages_conversation_id_created_at_id", "conversation_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     conversation_id = Column(
         pgUUID(as_uuid=True), ForeignKey("conversations.id"), nullable=False
     )
     sender_role = Column(String, nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=SERVER_NOW)
     timezone = Column(String, nullable=True) # New timezone column
+    # Jawaban assistant yang terpotong karena klien memutus stream
+    is_truncated = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     conversation = relationship("Conversation", back_populates="messages")
 
 
 # --- Model MemoryEmbedding ---
 class MemoryEmbedding(Base):
     __tablename__ = "memory_embeddings"
+    __table_args__ = vector_index("ix_memory_embeddings_content_embedding", "content_embedding") + (
+        Index("ix_memory_embeddings_user_id_conversation_id", "user_id", "conversation_id"),
+    )
     id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     message_id = Column(pgUUID(as_uuid=True), ForeignKey("messages.id"), nullable=False)
     conversation_id = Column(
@@ -73,35 +250,157 @@ class MemoryEmbedding(Base):
     )
     user_id = Column(String, nullable=False)
     content_embedding = Column(Vector(768), nullable=False)  # Gemini embedding size
-    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=SERVER_NOW)
 
 
 # --- Model Document ---
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Upload ulang file yang identik dicari lewat hash isinya
+        Index("ix_documents_content_hash", "content_hash"),
+    )
     id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     filename = Column(String, nullable=False)
     title = Column(String, nullable=True)
     file_path = Column(String, nullable=False)
     file_size = Column(String, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 file PDF
     uploaded_by = Column(pgUUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     uploaded_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
     document_chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
+    ingestion_jobs = relationship(
+        "IngestionJob", back_populates="document", cascade="all, delete-orphan",
+        foreign_keys="IngestionJob.document_id",
+    )
 
 # --- Model DocumentChunk ---
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = vector_index("ix_document_chunks_content_embedding", "content_embedding") + (
+        Index("ix_document_chunks_document_id", "document_id"),
+        Index("ix_document_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
     id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(pgUUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
     chunk_index = Column(String, nullable=False)  # "page_1", "page_2", etc.
     content = Column(Text, nullable=False)
     content_embedding = Column(Vector(768), nullable=False)  # Gemini embedding size
     page_number = Column(String, nullable=True)
+    # SHA-256 content: upload versi baru memakai ulang embedding chunk yang isinya sama
+    content_hash = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    # Diisi Postgres dari content; deferred agar tidak ikut dimuat saat select entity
+    content_tsv = deferred(Column(TSVECTOR, Computed(CONTENT_TSV_EXPRESSION, persisted=True)))
     document = relationship("Document", back_populates="document_chunks")
 
 
+# --- Model IngestionJob ---
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (
+        # resume_pending mencari job aktif yang sudah lama tidak di-update
+        Index("ix_ingestion_jobs_status_updated_at", "status", "updated_at"),
+    )
+    id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(pgUUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued/parsing/embedding/done/failed
+    chunks_done = Column(Integer, nullable=False, default=0)
+    chunks_total = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    # Upload versi baru: dokumen lama jadi sumber embedding dan dinonaktifkan setelah selesai
+    replaces_document_id = Column(
+        pgUUID(as_uuid=True), ForeignKey("documents.id", ondelete="SET NULL"), nullable=True
+    )
+    embeddings_reused = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    document = relationship(
+        "Document", back_populates="ingestion_jobs", foreign_keys=[document_id]
+    )
+
+
+# Kunci advisory sesi agar dua worker tidak membangun ulang index bersamaan
+INDEX_REBUILD_LOCK_ID = 7_311_043
+
+
+class IndexRebuildBusy(Exception):
+    """Rebuild index vektor sedang berjalan di koneksi/proses lain."""
+
+
+def vector_indexes() -> list[Index]:
+    return [
+        index
+        for model in (MemoryEmbedding, DocumentChunk)
+        for index in model.__table__.indexes
+        if index.name.endswith("_content_embedding")
+    ]
+
+
+def create_vector_indexes(sync_conn):
+    """Buat index vektor yang belum ada (dipanggil lewat `conn.run_sync`)."""
+    for index in vector_indexes():
+        index.create(sync_conn, checkfirst=True)
+
+
+def _create_index_concurrently_sql(sync_conn, index: Index, name: str) -> str:
+    ddl = str(CreateIndex(index).compile(dialect=sync_conn.dialect))
+    return ddl.replace(f"CREATE INDEX {index.name} ", f'CREATE INDEX CONCURRENTLY "{name}" ', 1)
+
+
+def rebuild_vector_indexes(sync_conn) -> list[str]:
+    """Bangun ulang index vektor tanpa mengunci tabel, mis. setelah bulk load (IVFFlat) atau ganti parameter.
+
+    Harus dipanggil pada koneksi AUTOCOMMIT (CONCURRENTLY tidak boleh di dalam
+    transaksi). Index baru dibangun dengan nama sementara sementara query tetap
+    memakai index lama, lalu index lama di-drop dan yang baru di-rename.
+    """
+    acquired = sync_conn.execute(
+        text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": INDEX_REBUILD_LOCK_ID}
+    ).scalar()
+    if not acquired:
+        raise IndexRebuildBusy("Rebuild index vektor sedang berjalan di proses lain")
+    # Build index pada tabel besar tidak boleh terkena DB_STATEMENT_TIMEOUT_MS
+    sync_conn.execute(text("SET statement_timeout = 0"))
+    names = []
+    try:
+        for index in vector_indexes():
+            staging = f"{index.name}_rebuild"
+            # Sisa rebuild yang terputus tertinggal sebagai index INVALID
+            sync_conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{staging}"'))
+            sync_conn.execute(text(_create_index_concurrently_sql(sync_conn, index, staging)))
+            sync_conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+            sync_conn.execute(text(f'ALTER INDEX "{staging}" RENAME TO "{index.name}"'))
+            names.append(index.name)
+    finally:
+        # Koneksi kembali ke pool: pulihkan timeout bawaan dan lepas lock sesi
+        sync_conn.execute(text("RESET statement_timeout"))
+        sync_conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": INDEX_REBUILD_LOCK_ID})
+    return names
+
+
+async def rebuild_vector_indexes_online() -> list[str]:
+    """Jalankan `rebuild_vector_indexes` pada koneksi AUTOCOMMIT tersendiri."""
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        return await conn.run_sync(rebuild_vector_indexes)
+
+
+async def apply_vector_search_params(
+    session: AsyncSession, ef_search: int | None = None, probes: int | None = None
+):
+    """Set parameter pencarian ANN untuk transaksi ini saja (SET LOCAL)."""
+    if VECTOR_INDEX_TYPE == "hnsw":
+        await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search or HNSW_EF_SEARCH)}"))
+        if VECTOR_ITERATIVE_SCAN:
+            await session.execute(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+    elif VECTOR_INDEX_TYPE == "ivfflat":
+        await session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes or IVFFLAT_PROBES)}"))
+        if VECTOR_ITERATIVE_SCAN:
+            await session.execute(text("SET LOCAL ivfflat.iterative_scan = relaxed_order"))
+
+
 async def get_db():
     async with async_session() as session:
         yield session
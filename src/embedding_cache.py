@@ -0,0 +1,151 @@
+import os
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+# Tier kedua opsional di disk (SQLite), tetap hidup setelah restart
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+
+
+def normalize_text(text: str) -> str:
+    """Normalisasi ringan supaya variasi spasi/unicode dari pertanyaan yang sama berbagi entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class DiskTier:
+    """Penyimpanan embedding di SQLite; vektor disimpan sebagai float32."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, ttl: float) -> list[float] | None:
+        row = self._conn.execute(
+            "SELECT vector, created_at FROM embedding_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        if ttl and time.time() - row[1] > ttl:
+            self._conn.execute("DELETE FROM embedding_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        return array.array("f", row[0]).tolist()
+
+    def set(self, key: str, vector: list[float]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO embedding_cache (key, vector, created_at) VALUES (?, ?, ?)",
+            (key, array.array("f", vector).tobytes(), time.time()),
+        )
+        self._conn.commit()
+
+    def clear(self):
+        self._conn.execute("DELETE FROM embedding_cache")
+        self._conn.commit()
+
+
+class EmbeddingCache:
+    """Cache embedding query dengan eviction LRU + TTL, aman dipakai dari beberapa thread."""
+
+    def __init__(
+        self,
+        max_entries: int = EMBEDDING_CACHE_SIZE,
+        ttl: float = EMBEDDING_CACHE_TTL,
+        disk_path: str | None = EMBEDDING_CACHE_PATH,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = DiskTier(disk_path) if disk_path else None
+        # Satu koneksi SQLite dipakai dari beberapa thread executor
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str, model: str) -> list[float] | None:
+        """Lookup tier memori saja; cukup cepat untuk dipanggil di event loop."""
+        key = cache_key(text, model)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+            if self._disk is None:
+                self.misses += 1
+            return None
+
+    @property
+    def has_disk(self) -> bool:
+        return self._disk is not None
+
+    def get_disk(self, text: str, model: str) -> list[float] | None:
+        """Lookup tier disk (I/O SQLite): jalankan di thread executor, bukan di event loop."""
+        key = cache_key(text, model)
+        with self._disk_lock:
+            vector = self._disk.get(key, self.ttl)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, vector, time.monotonic())
+            return vector
+
+    def put(self, text: str, model: str, vector: list[float]):
+        with self._lock:
+            self._store(cache_key(text, model), vector, time.monotonic())
+
+    def put_disk(self, text: str, model: str, vector: list[float]):
+        """Tulis ke tier disk; seperti get_disk, dipanggil dari thread executor."""
+        with self._disk_lock:
+            self._disk.set(cache_key(text, model), vector)
+
+    def _store(self, key: str, vector: list[float], now: float):
+        self._entries[key] = (now + self.ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk:
+                with self._disk_lock:
+                    self._disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_tier": self._disk is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
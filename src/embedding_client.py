@@ -0,0 +1,223 @@
+import os
+import time
+import math
+import random
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol
+
+from .embedding_cache import EmbeddingCache, cache_key
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini").lower()  # 'gemini' atau 'hash'
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+EMBEDDING_DIM = 768  # Sesuai kolom Vector(768)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "8"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "10"))
+EMBEDDING_BREAKER_THRESHOLD = int(os.getenv("EMBEDDING_BREAKER_THRESHOLD", "5"))
+EMBEDDING_BREAKER_COOLDOWN = float(os.getenv("EMBEDDING_BREAKER_COOLDOWN", "30"))
+
+
+class EmbeddingUnavailable(Exception):
+    """Backend embedding gagal, timeout, atau circuit breaker sedang terbuka."""
+
+
+class EmbeddingBackend(Protocol):
+    model_name: str
+
+    def embed_query(self, text: str) -> list[float]: ...
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]: ...
+
+
+class GeminiEmbeddingBackend:
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        self.model_name = model
+        self._embeddings = GoogleGenerativeAIEmbeddings(model=model)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embeddings.embed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embeddings.embed_documents(texts)
+
+
+class HashEmbeddingBackend:
+    """Backend embedding lokal yang deterministik, untuk test dan benchmark tanpa jaringan."""
+
+    def __init__(self, size: int = EMBEDDING_DIM, latency: float = 0.0):
+        self.model_name = f"hash-{size}"
+        self.size = size
+        self.latency = latency
+
+    def _vector(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.size)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_query(self, text: str) -> list[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+
+def get_backend(name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+    if name == "hash":
+        return HashEmbeddingBackend()
+    if name == "gemini":
+        return GeminiEmbeddingBackend()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {name}")
+
+
+class CircuitBreaker:
+    """Setelah `threshold` kegagalan berturut-turut, tolak panggilan selama `cooldown` detik."""
+
+    def __init__(self, threshold: int = EMBEDDING_BREAKER_THRESHOLD, cooldown: float = EMBEDDING_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        # Saat half-open, panggilan berikutnya jadi percobaan; gagal lagi -> buka lagi
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class AsyncEmbeddingClient:
+    """Embedding non-blocking: backend sync dijalankan di thread pool khusus dengan
+    batas konkurensi, timeout, circuit breaker, dan cache untuk query."""
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        cache: EmbeddingCache | None = None,
+        threads: int = EMBEDDING_THREADS,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        timeout: float = EMBEDDING_TIMEOUT,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="embedding")
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    @property
+    def query_model(self) -> str:
+        return f"{self.backend.model_name}:query"
+
+    async def _call(self, fn, *args):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise EmbeddingUnavailable("Embedding circuit breaker is open")
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            self.calls += 1
+            try:
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, fn, *args), timeout=self.timeout
+                )
+            except asyncio.TimeoutError as e:
+                self.timeouts += 1
+                self.failures += 1
+                self.breaker.record_failure()
+                raise EmbeddingUnavailable(f"Embedding timeout after {self.timeout}s") from e
+            except Exception as e:
+                self.failures += 1
+                self.breaker.record_failure()
+                raise EmbeddingUnavailable(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    async def embed_query(self, text: str) -> list[float]:
+        if self.cache:
+            vector = self.cache.get(text, self.query_model)
+            if vector is not None:
+                return vector
+
+        # Request bersamaan untuk teks yang sama cukup memanggil backend sekali.
+        # Panggilan backend punya task sendiri dan semua pemanggil (termasuk yang
+        # pertama) menunggu lewat shield: pemanggil yang dibatalkan tidak ikut
+        # membatalkan request lain yang menunggu teks yang sama.
+        key = cache_key(text, self.query_model)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._embed_query_uncached(text))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+            # Hindari warning "exception was never retrieved" bila semua penunggu sudah pergi
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def _embed_query_uncached(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        disk = self.cache is not None and self.cache.has_disk
+        if disk:
+            # Tier disk (SQLite) dibaca di thread executor agar event loop tidak terblokir
+            vector = await loop.run_in_executor(
+                self._executor, self.cache.get_disk, text, self.query_model
+            )
+            if vector is not None:
+                return vector
+        vector = await self._call(self.backend.embed_query, text)
+        if self.cache:
+            self.cache.put(text, self.query_model, vector)
+            if disk:
+                # Tulis ke disk di belakang; pemanggil tidak perlu menunggu commit SQLite
+                loop.run_in_executor(self._executor, self.cache.put_disk, text, self.query_model, vector)
+        return vector
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._call(self.backend.embed_documents, texts)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.model_name,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "inflight": len(self._inflight),
+            "breaker_state": self.breaker.state,
+        }
+
+
+# Instance bersama untuk aplikasi: backend dipilih lewat EMBEDDING_BACKEND, dengan
+# cache query yang dipakai oleh semua jalur retrieval
+embedding_service = AsyncEmbeddingClient(get_backend(), cache=EmbeddingCache())
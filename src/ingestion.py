@@ -0,0 +1,202 @@
+import os
+import time
+import random
+import asyncio
+import uuid
+import hashlib
+from dataclasses import dataclass
+from typing import AsyncIterable, Awaitable, Callable, Iterable
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import database as db
+
+# Konfigurasi pipeline embedding (bisa diatur lewat env)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", "1.0"))
+CHUNK_INSERT_BATCH_SIZE = int(os.getenv("CHUNK_INSERT_BATCH_SIZE", "500"))
+# Ukuran chunk teks (karakter); overlap juga dipakai rerank untuk membuang teks ganda
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+
+@dataclass
+class PendingChunk:
+    chunk_index: str
+    content: str
+    page_number: str
+
+    @property
+    def content_hash(self) -> str:
+        return content_hash(self.content)
+
+
+@dataclass
+class IngestResult:
+    chunks: int = 0
+    embeddings_reused: int = 0
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_page(page_num: int, text: str, splitter) -> list[PendingChunk]:
+    if not text or not text.strip():
+        return []
+    return [
+        PendingChunk(
+            chunk_index=f"page_{page_num}_chunk_{chunk_idx}",
+            content=chunk,
+            page_number=str(page_num),
+        )
+        for chunk_idx, chunk in enumerate(splitter.split_text(text))
+        if chunk.strip()
+    ]
+
+
+async def _iterate(pages: Iterable | AsyncIterable):
+    if isinstance(pages, AsyncIterable):
+        async for page in pages:
+            yield page
+    else:
+        for page in pages:
+            yield page
+
+
+async def _embed_batch(
+    embedder, batch: list[str], max_retries: int, backoff: float
+) -> list[list[float]]:
+    attempt = 0
+    while True:
+        try:
+            vectors = await embedder.embed_documents(batch)
+            if len(vectors) != len(batch):
+                raise ValueError(
+                    f"Embedding backend returned {len(vectors)} vectors for {len(batch)} texts"
+                )
+            return vectors
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = backoff * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+            print(f"⚠️ Embedding batch gagal (percobaan {attempt}/{max_retries}): {e}. Retry dalam {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def embed_texts(
+    texts: list[str],
+    embedder,
+    batch_size: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+    max_retries: int = EMBED_MAX_RETRIES,
+    backoff: float = EMBED_RETRY_BACKOFF,
+    on_progress: Callable[[int], Awaitable[None]] | None = None,
+) -> list[list[float]]:
+    """Embed teks per batch lewat `embedder.embed_documents` (AsyncEmbeddingClient),
+    dengan konkurensi terbatas dan retry per batch. Urutan hasil sama dengan urutan input.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    async def run(batch):
+        async with semaphore:
+            vectors = await _embed_batch(embedder, batch, max_retries, backoff)
+        if on_progress:
+            await on_progress(len(batch))
+        return vectors
+
+    results = await asyncio.gather(*(run(batch) for batch in batches))
+    return [vector for vectors in results for vector in vectors]
+
+
+async def bulk_insert_chunks(
+    session: AsyncSession,
+    document_id: uuid.UUID,
+    chunks: list[PendingChunk],
+    vectors: list[list[float]],
+    batch_size: int = CHUNK_INSERT_BATCH_SIZE,
+):
+    """Tulis DocumentChunk secara bulk (executemany), bukan satu per satu."""
+    rows = [
+        {
+            "document_id": document_id,
+            "chunk_index": chunk.chunk_index,
+            "content": chunk.content,
+            "content_embedding": vector,
+            "page_number": chunk.page_number,
+            "content_hash": chunk.content_hash,
+        }
+        for chunk, vector in zip(chunks, vectors)
+    ]
+    for i in range(0, len(rows), batch_size):
+        await session.execute(insert(db.DocumentChunk), rows[i:i + batch_size])
+
+
+async def ingest_pages(
+    session: AsyncSession,
+    document: db.Document,
+    pages: Iterable[tuple[int, str]] | AsyncIterable[tuple[int, str]],
+    embedder,
+    splitter,
+    progress=None,
+    window: int = EMBED_BATCH_SIZE * EMBED_CONCURRENCY,
+    reuse: dict[str, list[float]] | None = None,
+) -> IngestResult:
+    """Chunk, embed, dan simpan semua halaman dokumen.
+
+    `pages` boleh berupa async iterator (mis. ekstraksi PDF di process pool):
+    chunk di-embed dan disimpan per `window` chunk selagi halaman berikutnya
+    masih diekstrak. `reuse` memetakan content_hash -> embedding dari versi
+    dokumen sebelumnya; chunk yang isinya sama tidak di-embed ulang.
+    `progress` (opsional) menerima `stage(status, total)` dan `advance(n)`,
+    dipakai oleh job queue untuk melaporkan kemajuan.
+    """
+    result = IngestResult()
+    reuse = reuse or {}
+    pending: list[PendingChunk] = []
+    start = time.perf_counter()
+
+    async def flush():
+        chunks = pending[:]
+        pending.clear()
+        result.chunks += len(chunks)
+        # Total chunk baru diketahui bertahap; laporkan yang sudah terlihat
+        if progress:
+            await progress.stage("embedding", total=result.chunks)
+        vectors = [reuse.get(chunk.content_hash) for chunk in chunks]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        reused = len(chunks) - len(missing)
+        result.embeddings_reused += reused
+        if progress and reused:
+            await progress.advance(reused)
+        if missing:
+            embedded = await embed_texts(
+                [chunks[i].content for i in missing],
+                embedder,
+                on_progress=progress.advance if progress else None,
+            )
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+        await bulk_insert_chunks(session, document.id, chunks, vectors)
+
+    async for page_num, text in _iterate(pages):
+        pending.extend(split_page(page_num, text, splitter))
+        if len(pending) >= window:
+            await flush()
+    if pending:
+        await flush()
+    elif progress and result.chunks == 0:
+        await progress.stage("embedding", total=0)
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"📄 INGEST: {result.chunks} chunks diekstrak & di-embed dalam {elapsed:.2f}s "
+        f"({result.chunks / elapsed if elapsed else 0:.1f} chunks/s, "
+        f"{result.embeddings_reused} embedding dipakai ulang)"
+    )
+    return result
@@ -1,27 +1,55 @@
+import sys
 import asyncio
-from database import engine, Base
+import argparse
+from database import engine
+import migrations
+import query_plans
 
 
 async def init_models():
+    # Skema dikelola migrasi berversi (lihat migrations.py)
     async with engine.begin() as conn:
-        # Aktifkan ekstensi pgvector
-        await conn.run_sync(
-            lambda sync_conn: sync_conn.execute(
-                text("CREATE EXTENSION IF NOT EXISTS vector")
-            )
-        )
+        applied = await migrations.upgrade(conn)
+    if not applied:
+        print("Skema sudah versi terbaru.")
 
-        # Hapus semua tabel (untuk development)
-        # await conn.run_sync(Base.metadata.drop_all)
 
-        # Buat semua tabel
-        print("Tabel yang akan dibuat:", list(Base.metadata.tables.keys()))
-        await conn.run_sync(Base.metadata.create_all)
+async def show_status():
+    async with engine.begin() as conn:
+        pending = await migrations.pending(conn)
+    if not pending:
+        print("Tidak ada migrasi tertunda.")
+    for item in pending:
+        print(f"Tertunda {item.version:03d}: {item.name}")
+
+
+async def check_plans() -> bool:
+    # Data seed hanya hidup di transaksi ini dan selalu di-rollback
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            results = await query_plans.check_plans(conn)
+        finally:
+            await transaction.rollback()
+    for check, ok, used in results:
+        status = "OK  " if ok else "FAIL"
+        print(f"[{status}] {check.name}: harap {check.expected_index}, terpakai {sorted(used) or '-'}")
+    return all(ok for _, ok, _ in results)
 
 
 if __name__ == "__main__":
-    # Tambahkan import text
-    from sqlalchemy import text
+    parser = argparse.ArgumentParser(description="Inisialisasi / migrasi database")
+    parser.add_argument("--status", action="store_true", help="Tampilkan migrasi yang belum diterapkan")
+    parser.add_argument(
+        "--check-plans", action="store_true",
+        help="Seed data sementara dan pastikan query utama memakai index (exit 1 jika gagal)",
+    )
+    args = parser.parse_args()
 
-    asyncio.run(init_models())
-    print("Database tables created.")
+    if args.status:
+        asyncio.run(show_status())
+    elif args.check_plans:
+        sys.exit(0 if asyncio.run(check_plans()) else 1)
+    else:
+        asyncio.run(init_models())
+        print("Database tables created.")
@@ -0,0 +1,221 @@
+import os
+import time
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, delete
+from sqlalchemy.future import select
+
+from . import database as db
+from . import services
+from .database import async_session
+from .response_cache import response_cache
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_RESUME_ON_STARTUP = os.getenv("INGESTION_RESUME_ON_STARTUP", "true").lower() == "true"
+# Job aktif yang tidak di-update selama ini dianggap milik proses yang sudah mati
+INGESTION_STALE_SECONDS = int(os.getenv("INGESTION_STALE_SECONDS", "300"))
+# Job yang sedang berjalan memperbarui updated_at sesering ini (harus << INGESTION_STALE_SECONDS)
+INGESTION_HEARTBEAT_SECONDS = float(os.getenv("INGESTION_HEARTBEAT_SECONDS", "30"))
+PROGRESS_FLUSH_INTERVAL = 1.0
+
+ACTIVE_STATUSES = ("queued", "parsing", "embedding")
+
+
+class JobProgress:
+    """Catat status dan progres job ke tabel ingestion_jobs (pakai session terpisah)."""
+
+    def __init__(self, job_id: uuid.UUID):
+        self.job_id = job_id
+        self.chunks_done = 0
+        self._last_flush = 0.0
+
+    async def _update(self, **values):
+        async with async_session() as session:
+            await session.execute(
+                update(db.IngestionJob)
+                .where(db.IngestionJob.id == self.job_id)
+                .values(updated_at=datetime.utcnow(), **values)
+            )
+            await session.commit()
+
+    async def stage(self, status: str, total: int | None = None):
+        values = {"status": status}
+        if total is not None:
+            values["chunks_total"] = total
+        await self._update(**values)
+
+    async def advance(self, count: int):
+        self.chunks_done += count
+        now = time.monotonic()
+        if now - self._last_flush >= PROGRESS_FLUSH_INTERVAL:
+            self._last_flush = now
+            await self._update(chunks_done=self.chunks_done)
+
+    async def heartbeat(self, interval: float = INGESTION_HEARTBEAT_SECONDS):
+        # Tanda job masih hidup (mis. saat ekstraksi PDF panjang tanpa progres chunk)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._update()
+            except Exception as e:
+                print(f"⚠️ INGEST: heartbeat job {self.job_id} gagal: {e}")
+
+    async def finish(self, total: int, embeddings_reused: int = 0):
+        await self._update(
+            status="done", chunks_done=total, chunks_total=total, error=None,
+            embeddings_reused=embeddings_reused,
+        )
+
+    async def fail(self, error: str):
+        await self._update(status="failed", error=error)
+
+
+class IngestionQueue:
+    """Worker pool in-process untuk memproses upload dokumen di background."""
+
+    def __init__(self, workers: int = INGESTION_WORKERS):
+        self.workers = workers
+        self._queue: asyncio.Queue[uuid.UUID] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        # Job yang sudah ada di antrian proses ini (hindari duplikat dari sweeper)
+        self._pending: set[uuid.UUID] = set()
+
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingestion-worker-{i}")
+            for i in range(self.workers)
+        ]
+        if INGESTION_RESUME_ON_STARTUP:
+            self._tasks.append(
+                asyncio.create_task(self._sweeper(), name="ingestion-sweeper")
+            )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, job_id: uuid.UUID):
+        if job_id in self._pending:
+            return
+        self._pending.add(job_id)
+        await self._queue.put(job_id)
+
+    async def _claim(self, job_id: uuid.UUID) -> bool:
+        """Ambil job secara atomik (queued -> parsing); hanya satu worker/proses yang menang."""
+        async with async_session() as session:
+            result = await session.execute(
+                update(db.IngestionJob)
+                .where(db.IngestionJob.id == job_id, db.IngestionJob.status == "queued")
+                .values(status="parsing", chunks_done=0, updated_at=datetime.utcnow())
+                .returning(db.IngestionJob.id)
+            )
+            claimed = result.first() is not None
+            await session.commit()
+        return claimed
+
+    async def resume_pending(self):
+        """Ambil alih job yang terputus (mis. server restart) dan proses ulang dari file dokumen.
+
+        Job yang masih berjalan di proses mana pun memperbarui updated_at lewat
+        heartbeat, jadi tidak pernah dianggap stale; eksekusi ganda juga dicegah
+        oleh `_claim`.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=INGESTION_STALE_SECONDS)
+        async with async_session() as session:
+            result = await session.execute(
+                update(db.IngestionJob)
+                .where(
+                    db.IngestionJob.status.in_(ACTIVE_STATUSES),
+                    db.IngestionJob.updated_at < cutoff,
+                )
+                .values(status="queued", chunks_done=0, updated_at=datetime.utcnow())
+                .returning(db.IngestionJob.id)
+            )
+            job_ids = [row[0] for row in result.all()]
+            await session.commit()
+        for job_id in job_ids:
+            print(f"🔁 INGEST: melanjutkan job {job_id}")
+            await self.enqueue(job_id)
+
+    async def _sweeper(self):
+        while True:
+            try:
+                await self.resume_pending()
+            except Exception as e:
+                print(f"⚠️ INGEST: gagal melanjutkan job tertunda: {e}")
+            await asyncio.sleep(INGESTION_STALE_SECONDS)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._pending.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"⚠️ INGEST: worker error pada job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: uuid.UUID):
+        if not await self._claim(job_id):
+            return
+        progress = JobProgress(job_id)
+        heartbeat = asyncio.create_task(progress.heartbeat())
+        try:
+            await self._process(job_id, progress)
+        finally:
+            heartbeat.cancel()
+
+    async def _process(self, job_id: uuid.UUID, progress: JobProgress):
+        async with async_session() as session:
+            result = await session.execute(
+                select(db.IngestionJob).filter_by(id=job_id)
+            )
+            job = result.scalars().first()
+            if not job or job.status not in ACTIVE_STATUSES:
+                return
+            result = await session.execute(
+                select(db.Document).filter_by(id=job.document_id)
+            )
+            document = result.scalars().first()
+            if not document:
+                await progress.fail("Document not found")
+                return
+
+            try:
+                # Buang chunk sisa percobaan sebelumnya agar job idempotent
+                await session.execute(
+                    delete(db.DocumentChunk).where(db.DocumentChunk.document_id == document.id)
+                )
+                result = await services.process_pdf_document(
+                    session, document, progress=progress,
+                    previous_document_id=job.replaces_document_id,
+                )
+            except Exception as e:
+                await session.rollback()
+                print(f"⚠️ INGEST: job {job_id} gagal: {e}")
+                await progress.fail(str(e))
+                return
+
+            if job.replaces_document_id:
+                # Versi baru siap: versi lama berhenti dipakai RAG (tetap ada untuk rollback)
+                await session.execute(
+                    update(db.Document)
+                    .where(db.Document.id == job.replaces_document_id)
+                    .values(is_active=False)
+                )
+                await session.commit()
+                response_cache.invalidate_document(job.replaces_document_id)
+                print(
+                    f"♻️ INGEST: dokumen {document.id} menggantikan {job.replaces_document_id}, "
+                    f"{result.embeddings_reused}/{result.chunks} embedding dipakai ulang"
+                )
+
+        await progress.finish(result.chunks, result.embeddings_reused)
+
+
+ingestion_queue = IngestionQueue()
@@ -1,15 +1,40 @@
 import dotenv
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import os
 
 from .routers import auth, admin, chat, frontend # Import routers
+from . import jobs, services, uploads
+from .memory_writer import memory_buffer
+from .tasks import task_supervisor
+from .passwords import password_hasher
+from .pdf_extract import pdf_extractor
 
 dotenv.load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Worker ingest dokumen berjalan selama aplikasi hidup
+    await jobs.ingestion_queue.start()
+    await memory_buffer.start()
+    await task_supervisor.start()
+    yield
+    await jobs.ingestion_queue.stop()
+    # Task setelah-respons dikosongkan dulu: embedding-nya masih masuk ke memory buffer
+    await task_supervisor.stop()
+    await memory_buffer.stop()
+    services.embedding_service.shutdown()
+    password_hasher.shutdown()
+    pdf_extractor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
+# Upload kebesaran ditolak sebelum Starlette menyalin body-nya ke disk
+app.add_middleware(uploads.UploadSizeLimit, paths={"/api/admin/upload"})
 
 # Include routers
 app.include_router(auth.router)
@@ -0,0 +1,118 @@
+import os
+import asyncio
+import logging
+
+from sqlalchemy import insert
+
+from . import database as db
+from .database import async_session
+
+MEMORY_FLUSH_SIZE = int(os.getenv("MEMORY_FLUSH_SIZE", "64"))
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "2"))
+# Batas baris yang ditahan di memori bila DB sedang gagal; kelebihannya dibuang
+MEMORY_MAX_PENDING = int(os.getenv("MEMORY_MAX_PENDING", "5000"))
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryWriteBuffer:
+    """Write-behind buffer untuk baris MemoryEmbedding.
+
+    Baris dikumpulkan di memori lalu di-insert bulk (satu transaksi) setiap
+    `flush_interval` detik atau saat jumlahnya mencapai `flush_size`.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = MEMORY_FLUSH_SIZE,
+        flush_interval: float = MEMORY_FLUSH_INTERVAL,
+        max_pending: int = MEMORY_MAX_PENDING,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._rows: list[dict] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def add(self, **row):
+        if len(self._rows) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_size:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Sisa buffer ditulis sebelum aplikasi berhenti
+        await self.flush()
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                async with async_session() as session:
+                    await session.execute(insert(db.MemoryEmbedding), rows)
+                    await session.commit()
+                written = len(rows)
+            except Exception as e:
+                # Satu baris yang rusak (mis. percakapannya sudah dihapus) tidak boleh
+                # membatalkan seluruh batch: tulis ulang satu per satu
+                self.failures += 1
+                logger.warning("Bulk insert memory gagal (%s baris): %s", len(rows), e)
+                written = await self._insert_individually(rows)
+            self.written += written
+            self.flushes += 1
+            return written
+
+    async def _insert_individually(self, rows: list[dict]) -> int:
+        written = 0
+        async with async_session() as session:
+            for row in rows:
+                try:
+                    async with session.begin_nested():
+                        await session.execute(insert(db.MemoryEmbedding), [row])
+                    written += 1
+                except Exception:
+                    self.dropped += 1
+            await session.commit()
+        return written
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._rows),
+            "written": self.written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+
+memory_buffer = MemoryWriteBuffer()
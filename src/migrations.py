@@ -0,0 +1,183 @@
+"""Migrasi skema berversi.
+
+Setiap migrasi punya nomor versi dan dicatat di tabel schema_migrations, sehingga
+hanya migrasi yang belum pernah dijalankan yang dieksekusi. Migrasi ditulis
+idempotent (IF NOT EXISTS) agar aman untuk database lama yang dibuat dengan
+create_all sebelum subsistem ini ada.
+
+Modul ini diimpor oleh init_db.py yang dijalankan sebagai script
+(`python src/init_db.py`), jadi import-nya absolut.
+"""
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+
+from database import Base, create_vector_indexes, SERVER_TIMESTAMP_TABLES, CONTENT_TSV_EXPRESSION
+
+# Kunci advisory agar dua proses tidak menjalankan migrasi bersamaan
+MIGRATION_LOCK_ID = 7_311_042
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[..., Awaitable[None]]
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append(Migration(version, name, fn))
+        return fn
+    return register
+
+
+@migration(1, "pgvector extension dan tabel dasar")
+async def _initial_schema(conn):
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    # checkfirst: tabel yang sudah ada tidak disentuh
+    await conn.run_sync(Base.metadata.create_all)
+
+
+@migration(2, "index ANN untuk kolom embedding")
+async def _vector_indexes(conn):
+    # HNSW/IVFFlat sesuai VECTOR_INDEX_TYPE
+    await conn.run_sync(create_vector_indexes)
+
+
+@migration(3, "created_at diisi server (clock_timestamp)")
+async def _server_timestamps(conn):
+    for table in SERVER_TIMESTAMP_TABLES:
+        await conn.execute(
+            text(f"ALTER TABLE {table} ALTER COLUMN created_at SET DEFAULT clock_timestamp()")
+        )
+
+
+@migration(4, "index B-tree komposit untuk pola akses percakapan/pesan")
+async def _access_pattern_indexes(conn):
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_created_at "
+        "ON messages (conversation_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user_id_created_at "
+        "ON conversations (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_memory_embeddings_user_id_conversation_id "
+        "ON memory_embeddings (user_id, conversation_id)",
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_document_id "
+        "ON document_chunks (document_id)",
+        "CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_status_updated_at "
+        "ON ingestion_jobs (status, updated_at)",
+    ):
+        await conn.execute(text(statement))
+
+
+@migration(5, "index keyset (created_at, id) untuk pagination percakapan/pesan")
+async def _keyset_indexes(conn):
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id_created_at_id "
+        "ON messages (conversation_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user_id_created_at_id "
+        "ON conversations (user_id, created_at, id)",
+        # Index versi 4 sudah tercakup prefix index baru
+        "DROP INDEX IF EXISTS ix_messages_conversation_id_created_at",
+        "DROP INDEX IF EXISTS ix_conversations_user_id_created_at",
+    ):
+        await conn.execute(text(statement))
+
+
+@migration(6, "kolom tsvector + index GIN untuk retrieval hybrid")
+async def _content_tsv(conn):
+    await conn.execute(text(
+        "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+        f"GENERATED ALWAYS AS ({CONTENT_TSV_EXPRESSION}) STORED"
+    ))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_tsv "
+        "ON document_chunks USING gin (content_tsv)"
+    ))
+
+
+@migration(7, "kolom ringkasan berjalan (digest) pada conversations")
+async def _conversation_digest(conn):
+    for statement in (
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS digest text",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS digest_through timestamptz",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS "
+        "digest_message_count integer NOT NULL DEFAULT 0",
+    ):
+        await conn.execute(text(statement))
+
+
+@migration(8, "flag is_truncated pada messages")
+async def _message_truncated(conn):
+    await conn.execute(text(
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS is_truncated boolean NOT NULL DEFAULT false"
+    ))
+
+
+@migration(9, "token_version pada users")
+async def _user_token_version(conn):
+    await conn.execute(text(
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version integer NOT NULL DEFAULT 0"
+    ))
+
+
+@migration(10, "content_hash pada documents untuk dedupe upload")
+async def _document_content_hash(conn):
+    await conn.execute(text("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash varchar(64)"))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)"
+    ))
+
+
+@migration(11, "content_hash chunk dan kolom versi dokumen pada ingestion_jobs")
+async def _incremental_reindex(conn):
+    for statement in (
+        "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash varchar(64)",
+        # Chunk lama ikut bisa dipakai ulang saat dokumennya di-upload versi baru
+        "UPDATE document_chunks SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex') "
+        "WHERE content_hash IS NULL",
+        "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS replaces_document_id uuid "
+        "REFERENCES documents(id) ON DELETE SET NULL",
+        "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS "
+        "embeddings_reused integer NOT NULL DEFAULT 0",
+    ):
+        await conn.execute(text(statement))
+
+
+async def applied_versions(conn) -> set[int]:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version integer PRIMARY KEY, name text NOT NULL, "
+        "applied_at timestamptz NOT NULL DEFAULT now())"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result.all()}
+
+
+async def upgrade(conn) -> list[Migration]:
+    """Jalankan migrasi yang belum diterapkan, berurutan, dalam transaksi `conn`."""
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    # Build index dan backfill bisa jauh melewati DB_STATEMENT_TIMEOUT_MS milik engine
+    await conn.execute(text("SET LOCAL statement_timeout = 0"))
+    done = await applied_versions(conn)
+    applied = []
+    for item in sorted(MIGRATIONS, key=lambda m: m.version):
+        if item.version in done:
+            continue
+        print(f"Migrasi {item.version:03d}: {item.name}")
+        await item.upgrade(conn)
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": item.version, "name": item.name},
+        )
+        applied.append(item)
+    return applied
+
+
+async def pending(conn) -> list[Migration]:
+    done = await applied_versions(conn)
+    return [item for item in sorted(MIGRATIONS, key=lambda m: m.version) if item.version not in done]
@@ -0,0 +1,43 @@
+import base64
+import uuid
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Kebalikan encode_cursor; ValueError jika cursor tidak valid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(stmt, created_col, id_col, cursor: str | None, limit: int):
+    """Terapkan keyset pagination (terbaru dulu) pada (created_at, id).
+
+    Mengambil limit + 1 baris supaya split_page tahu masih ada halaman berikutnya.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+    return stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def split_page(rows: list, limit: int) -> tuple[list, str | None]:
+    """(baris halaman ini, cursor halaman berikutnya atau None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .database import pwd_context
+
+# 'thread' cukup untuk bcrypt (melepas GIL); 'process' bila backend hash tidak melepas GIL
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, password_hash: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, password_hash)
+
+
+class PasswordHasher:
+    """Hash/verifikasi bcrypt di pool worker terbatas, di luar event loop.
+
+    Semaphore membatasi jumlah hash yang berjalan; sisanya menunggu secara
+    async sehingga lonjakan login tidak menumpuk di antrian executor.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, executor: str = PASSWORD_HASH_EXECUTOR):
+        self.workers = workers
+        self.kind = executor
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(workers)
+        self.calls = 0
+        self.rehashed = 0
+        self.busy_ms = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            elif self.kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+            else:
+                raise ValueError(f"Unknown PASSWORD_HASH_EXECUTOR: {self.kind}")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        async with self._semaphore:
+            self.calls += 1
+            start = time.perf_counter()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+            finally:
+                self.busy_ms += (time.perf_counter() - start) * 1000
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> tuple[bool, str | None]:
+        """(valid, hash_baru); hash_baru terisi bila cost hash lama berbeda dari BCRYPT_ROUNDS."""
+        valid, new_hash = await self._run(_verify_and_update, password, password_hash)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "calls": self.calls,
+            "rehashed": self.rehashed,
+            "avg_ms": round(self.busy_ms / self.calls, 1) if self.calls else 0.0,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,146 @@
+import os
+import signal
+import asyncio
+import multiprocessing
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
+
+from pypdf import PdfReader
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# Halaman yang ekstraksinya lebih lama dari ini dianggap kosong (PDF patologis)
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "30"))
+# Worker tidak di-fork langsung dari proses web (thread, event loop, koneksi DB)
+PDF_START_METHOD = os.getenv(
+    "PDF_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class PageTimeout(BaseException):
+    # BaseException: pypdf menangkap Exception di beberapa jalur parsing
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise PageTimeout()
+
+
+@lru_cache(maxsize=1)
+def _open(path: str, mtime: float) -> PdfReader:
+    # Satu worker biasanya memproses beberapa rentang dari PDF yang sama: parse xref sekali.
+    # Hanya satu reader per worker; dilepas setelah rentang terakhir dokumen (lihat keep_open)
+    return PdfReader(path)
+
+
+def _reader(path: str) -> PdfReader:
+    return _open(path, os.path.getmtime(path))
+
+
+def page_count(path: str) -> int:
+    return len(_reader(path).pages)
+
+
+def extract_range(
+    path: str, start: int, end: int, page_timeout: float = PDF_PAGE_TIMEOUT, keep_open: bool = True
+) -> list[tuple[int, str]]:
+    """Ekstrak teks halaman [start, end) (0-based); dijalankan di proses worker.
+
+    Timeout per halaman memakai SIGALRM (task pool proses berjalan di main
+    thread worker); di platform tanpa SIGALRM halaman tidak dibatasi waktunya.
+    `keep_open=False` melepas reader setelah selesai karena tidak ada rentang
+    dokumen ini yang masih menunggu.
+    """
+    reader = _reader(path)
+    use_alarm = page_timeout > 0 and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+    pages = []
+    try:
+        for index in range(start, end):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                text = reader.pages[index].extract_text() or ""
+            except PageTimeout:
+                print(f"⚠️ PDF: halaman {index + 1} melewati {page_timeout}s, dilewati ({path})")
+                text = ""
+                # Parsing yang terputus bisa meninggalkan state setengah jadi di reader
+                _open.cache_clear()
+                reader = _reader(path)
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            pages.append((index + 1, text))
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+        if not keep_open:
+            _open.cache_clear()
+    return pages
+
+
+class PdfExtractor:
+    """Ekstraksi teks PDF di process pool, dibagi per rentang halaman.
+
+    Hasil di-yield berurutan per halaman sambil rentang berikutnya masih
+    diproses, sehingga tahap chunk/embed bisa mulai sebelum seluruh PDF selesai.
+    """
+
+    def __init__(
+        self,
+        workers: int = PDF_EXTRACT_WORKERS,
+        pages_per_task: int = PDF_PAGES_PER_TASK,
+        page_timeout: float = PDF_PAGE_TIMEOUT,
+    ):
+        self.workers = workers
+        self.pages_per_task = pages_per_task
+        self.page_timeout = page_timeout
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(PDF_START_METHOD)
+            )
+        return self._executor
+
+    async def extract_pages(self, path: str) -> AsyncIterator[tuple[int, str]]:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        total = await loop.run_in_executor(executor, page_count, path)
+        ranges = deque(
+            (start, min(start + self.pages_per_task, total))
+            for start in range(0, total, self.pages_per_task)
+        )
+        # Batasi rentang yang sedang diproses agar teks yang belum dikonsumsi tidak menumpuk
+        inflight: deque[asyncio.Future] = deque()
+
+        def submit_next():
+            start, end = ranges.popleft()
+            inflight.append(loop.run_in_executor(
+                executor, extract_range, path, start, end, self.page_timeout, bool(ranges)
+            ))
+
+        try:
+            while ranges and len(inflight) < self.workers * 2:
+                submit_next()
+            while inflight:
+                pages = await inflight.popleft()
+                if ranges:
+                    submit_next()
+                for page in pages:
+                    yield page
+        finally:
+            for future in inflight:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pdf_extractor = PdfExtractor()
@@ -0,0 +1,137 @@
+"""Regression check rencana query: pastikan query panas memakai index B-tree.
+
+Data sintetis di-seed ke database lokal dalam satu transaksi yang di-rollback
+di akhir, lalu EXPLAIN tiap query dicek harus menyebut index yang diharapkan.
+Dijalankan lewat `python src/init_db.py --check-plans`.
+"""
+import json
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+SEED_USERS = 50
+SEED_CONVERSATIONS_PER_USER = 10
+SEED_MESSAGES_PER_CONVERSATION = 40
+SEED_MEMORY_ROWS = 2000
+SEED_DOCUMENTS = 20
+SEED_CHUNKS_PER_DOCUMENT = 100
+
+SEED_SQL = [
+    # uploaded_by dokumen butuh user nyata
+    "INSERT INTO users (id, username, password_hash, role, is_active) "
+    "VALUES (gen_random_uuid(), 'plan-check-admin', 'x', 'admin', true)",
+    "INSERT INTO conversations (id, user_id, created_at) "
+    "SELECT gen_random_uuid(), 'plan-user-' || (g % :users), now() - g * interval '1 minute' "
+    "FROM generate_series(1, :users * :conversations) g",
+    "INSERT INTO messages (id, conversation_id, sender_role, content, created_at) "
+    "SELECT gen_random_uuid(), c.id, CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END, "
+    "'pesan ' || g, c.created_at + g * interval '1 second' "
+    "FROM conversations c CROSS JOIN generate_series(1, :messages) g "
+    "WHERE c.user_id LIKE 'plan-user-%'",
+    "INSERT INTO memory_embeddings (id, message_id, conversation_id, user_id, content_embedding) "
+    "SELECT gen_random_uuid(), m.id, m.conversation_id, c.user_id, "
+    "CAST(array_fill(0.1::real, ARRAY[768]) AS vector) "
+    "FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+    "WHERE c.user_id LIKE 'plan-user-%' AND m.sender_role = 'user' LIMIT :memories",
+    "INSERT INTO documents (id, filename, file_path, uploaded_by, is_active) "
+    "SELECT gen_random_uuid(), 'plan-' || g || '.pdf', '/tmp/plan-' || g || '.pdf', "
+    "(SELECT id FROM users WHERE username = 'plan-check-admin'), true "
+    "FROM generate_series(1, :documents) g",
+    "INSERT INTO document_chunks (id, document_id, chunk_index, content, content_embedding) "
+    "SELECT gen_random_uuid(), d.id, 'page_1_chunk_' || g, 'isi ' || g, "
+    "CAST(array_fill(0.1::real, ARRAY[768]) AS vector) "
+    "FROM documents d CROSS JOIN generate_series(1, :chunks) g "
+    "WHERE d.filename LIKE 'plan-%'",
+    "ANALYZE users, conversations, messages, memory_embeddings, documents, document_chunks",
+]
+
+
+@dataclass(frozen=True)
+class PlanCheck:
+    name: str
+    sql: str
+    expected_index: str
+
+
+# Bentuk query mengikuti retrieval.get_chat_history, sidebar & halaman pesan (keyset),
+# filter memory di get_relevant_memories, penghapusan chunk per dokumen, dan
+# retrieval leksikal
+PLAN_CHECKS = [
+    PlanCheck(
+        "history chat per percakapan",
+        "SELECT id, sender_role, content FROM messages WHERE conversation_id = :conversation_id "
+        "ORDER BY created_at DESC LIMIT 10",
+        "ix_messages_conversation_id_created_at_id",
+    ),
+    PlanCheck(
+        "halaman pesan (keyset)",
+        "SELECT id, sender_role, content FROM messages WHERE conversation_id = :conversation_id "
+        "AND (created_at, id) < (now(), :conversation_id) ORDER BY created_at DESC, id DESC LIMIT 51",
+        "ix_messages_conversation_id_created_at_id",
+    ),
+    PlanCheck(
+        "sidebar percakapan user",
+        "SELECT id, summary, created_at FROM conversations WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 21",
+        "ix_conversations_user_id_created_at_id",
+    ),
+    PlanCheck(
+        "memory per user & percakapan",
+        "SELECT message_id FROM memory_embeddings "
+        "WHERE user_id = :user_id AND conversation_id = :conversation_id",
+        "ix_memory_embeddings_user_id_conversation_id",
+    ),
+    PlanCheck(
+        "chunk per dokumen",
+        "SELECT id FROM document_chunks WHERE document_id = :document_id",
+        "ix_document_chunks_document_id",
+    ),
+    PlanCheck(
+        "full-text search chunk",
+        "SELECT id FROM document_chunks "
+        "WHERE content_tsv @@ to_tsquery('simple'::regconfig, '42')",
+        "ix_document_chunks_content_tsv",
+    ),
+]
+
+
+def index_names(plan: dict) -> set[str]:
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= index_names(child)
+    return names
+
+
+async def seed(conn):
+    params = {
+        "users": SEED_USERS,
+        "conversations": SEED_CONVERSATIONS_PER_USER,
+        "messages": SEED_MESSAGES_PER_CONVERSATION,
+        "memories": SEED_MEMORY_ROWS,
+        "documents": SEED_DOCUMENTS,
+        "chunks": SEED_CHUNKS_PER_DOCUMENT,
+    }
+    for statement in SEED_SQL:
+        await conn.execute(text(statement), params)
+
+
+async def check_plans(conn) -> list[tuple[PlanCheck, bool, set[str]]]:
+    """Seed data, EXPLAIN setiap PlanCheck, lalu kembalikan (check, lolos, index terpakai)."""
+    await seed(conn)
+    row = (await conn.execute(text(
+        "SELECT c.id, c.user_id FROM conversations c WHERE c.user_id = 'plan-user-1' LIMIT 1"
+    ))).first()
+    document_id = (await conn.execute(text(
+        "SELECT id FROM documents WHERE filename LIKE 'plan-%' LIMIT 1"
+    ))).scalar_one()
+    params = {"conversation_id": row[0], "user_id": row[1], "document_id": document_id}
+
+    results = []
+    for check in PLAN_CHECKS:
+        raw = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {check.sql}"), params)).scalar_one()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+        used = index_names(plan)
+        results.append((check, check.expected_index in used, used))
+    return results
@@ -0,0 +1,124 @@
+import os
+import copy
+
+import numpy as np
+
+from .ingestion import CHUNK_OVERLAP
+from .context_builder import DOCUMENT_TOKEN_BUDGET, estimate_tokens
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+# 1.0 = murni relevansi, makin kecil makin mengutamakan keberagaman (MMR)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Bobot skor fusion (RRF) terhadap cosine saat menghitung relevansi kandidat
+RERANK_FUSION_WEIGHT = float(os.getenv("RERANK_FUSION_WEIGHT", "0.3"))
+# Kandidat dengan cosine >= ini terhadap chunk terpilih dianggap duplikat
+RERANK_DUPLICATE_THRESHOLD = float(os.getenv("RERANK_DUPLICATE_THRESHOLD", "0.97"))
+# Overlap sependek ini dianggap kebetulan, bukan hasil chunk_overlap
+MIN_OVERLAP_CHARS = 20
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min()
+    if spread <= 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+def overlap_length(previous: str, following: str, max_chars: int = CHUNK_OVERLAP) -> int:
+    """Panjang akhir `previous` yang sama dengan awal `following` (akibat chunk_overlap)."""
+    limit = min(max_chars, len(previous), len(following))
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if previous[-size:] == following[:size]:
+            return size
+    return 0
+
+
+def trim_overlaps(chunks: list) -> list:
+    """Buang teks ganda antar chunk bertetangga dari dokumen yang sama.
+
+    Chunk yang dipotong dikembalikan sebagai salinan; objek kandidat tidak diubah.
+    """
+    trimmed = []
+    for chunk in chunks:
+        for other in trimmed:
+            if other.document_id != chunk.document_id:
+                continue
+            # Chunk ini bisa berada sesudah atau sebelum chunk lain di dokumen aslinya
+            head = overlap_length(other.content, chunk.content)
+            tail = overlap_length(chunk.content, other.content)
+            if head and head < len(chunk.content):
+                chunk = copy.copy(chunk)
+                chunk.content = chunk.content[head:].lstrip()
+                break
+            if tail and tail < len(chunk.content):
+                chunk = copy.copy(chunk)
+                chunk.content = chunk.content[:-tail].rstrip()
+                break
+        trimmed.append(chunk)
+    return trimmed
+
+
+def rerank(
+    query_embedding: list[float] | None,
+    candidates: list,
+    k: int,
+    lambda_: float = MMR_LAMBDA,
+    token_budget: int = DOCUMENT_TOKEN_BUDGET,
+    fusion_weight: float = RERANK_FUSION_WEIGHT,
+    duplicate_threshold: float = RERANK_DUPLICATE_THRESHOLD,
+) -> list:
+    """Pilih maksimal k chunk dari kandidat dengan MMR, tanpa duplikat, dalam token_budget.
+
+    Kandidat harus punya `content`, `document_id`, `score`, dan `embedding`. Tanpa
+    embedding (mis. retrieval leksikal saja) urutan kandidat dipertahankan.
+    """
+    if not candidates or k <= 0:
+        return []
+
+    seen_texts = set()
+    unique = []
+    for chunk in candidates:
+        key = " ".join(chunk.content.split())
+        if key not in seen_texts:
+            seen_texts.add(key)
+            unique.append(chunk)
+
+    if query_embedding is not None and all(chunk.embedding is not None for chunk in unique):
+        vectors = _normalize_rows(np.asarray([chunk.embedding for chunk in unique], dtype=np.float32))
+        query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        cosine = vectors @ query
+        fusion = np.asarray([chunk.score for chunk in unique], dtype=np.float32)
+        relevance = (1 - fusion_weight) * _min_max(cosine) + fusion_weight * _min_max(fusion)
+        similarity = vectors @ vectors.T
+    else:
+        relevance = np.linspace(1.0, 0.0, num=len(unique), dtype=np.float32)
+        similarity = None
+
+    selected: list[int] = []
+    remaining = list(range(len(unique)))
+    used_tokens = 0
+    while remaining and len(selected) < k:
+        if similarity is not None and selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+            scores = lambda_ * relevance[remaining] - (1 - lambda_) * redundancy
+        else:
+            redundancy = None
+            scores = relevance[remaining]
+        position = int(np.argmax(scores))
+        index = remaining.pop(position)
+        if redundancy is not None and redundancy[position] >= duplicate_threshold:
+            continue
+        tokens = estimate_tokens(unique[index].content)
+        if used_tokens + tokens > token_budget and selected:
+            # Tidak muat; kandidat lain yang lebih pendek mungkin masih muat
+            continue
+        selected.append(index)
+        used_tokens += tokens
+
+    return trim_overlaps([unique[index] for index in selected])
@@ -0,0 +1,132 @@
+import os
+import math
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# Opt-in: jawaban LLM dipakai ulang untuk pertanyaan yang mirip atas chunk dokumen yang sama
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+@dataclass
+class CachedAnswer:
+    embedding: list[float]  # sudah dinormalisasi
+    chunk_key: tuple  # (user_id, frozenset chunk id)
+    document_ids: frozenset
+    response: str
+    expires_at: float
+
+
+class SemanticResponseCache:
+    """Cache jawaban berbasis kemiripan embedding query.
+
+    Hit jika set chunk hasil retrieval sama persis dan cosine similarity query
+    >= threshold. Entry dihapus saat dokumen sumbernya dihapus/dinonaktifkan.
+    Prompt jawaban memuat memory & history pemiliknya, jadi entry hanya
+    dipakai ulang untuk user yang sama.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        threshold: float = RESPONSE_CACHE_THRESHOLD,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[uuid.UUID, CachedAnswer] = OrderedDict()
+        self._buckets: dict[tuple, set[uuid.UUID]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _usable(self, query_embedding, chunks) -> bool:
+        # Hanya untuk pertanyaan yang dijawab dari dokumen
+        return self.enabled and query_embedding is not None and bool(chunks)
+
+    def lookup(self, user_id: str, query_embedding: list[float] | None, chunks) -> str | None:
+        if not self._usable(query_embedding, chunks):
+            return None
+        chunk_key = (user_id, frozenset(chunk.id for chunk in chunks))
+        query = _normalize(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get(chunk_key, ())):
+                entry = self._entries[entry_id]
+                if entry.expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                score = sum(a * b for a, b in zip(query, entry.embedding))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].response
+
+    def store(self, user_id: str, query_embedding: list[float] | None, chunks, response: str):
+        if not self._usable(query_embedding, chunks) or not response:
+            return
+        entry = CachedAnswer(
+            embedding=_normalize(query_embedding),
+            chunk_key=(user_id, frozenset(chunk.id for chunk in chunks)),
+            document_ids=frozenset(chunk.document_id for chunk in chunks),
+            response=response,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        entry_id = uuid.uuid4()
+        with self._lock:
+            self._entries[entry_id] = entry
+            self._buckets.setdefault(entry.chunk_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_document(self, document_id: uuid.UUID) -> int:
+        with self._lock:
+            stale = [
+                entry_id for entry_id, entry in self._entries.items()
+                if document_id in entry.document_ids
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def _remove(self, entry_id: uuid.UUID):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets.get(entry.chunk_key)
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[entry.chunk_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = SemanticResponseCache()
@@ -0,0 +1,395 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import Text, cast, func, literal_column
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from . import database as db
+from .database import async_session, Document, DocumentChunk
+from .embedding_client import embedding_service, EmbeddingUnavailable
+from . import rerank
+
+# Batas waktu per tahap retrieval; tahap yang lewat batas dilewati (konteks kosong)
+RETRIEVAL_STAGE_TIMEOUT = float(os.getenv("RETRIEVAL_STAGE_TIMEOUT", "5"))
+# 'hybrid' (vektor + full-text, digabung RRF), 'vector', atau 'lexical'
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# Konstanta k reciprocal rank fusion: skor = sum(1 / (k + rank))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Jumlah kandidat per retriever sebelum digabung
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+
+async def get_chat_history(
+    session: AsyncSession, conversation_id: uuid.UUID, limit: int = 10,
+    after: datetime | None = None
+):
+    """Pesan terakhir percakapan; `after` melewati pesan yang sudah masuk digest."""
+    stmt = select(db.Message).filter_by(conversation_id=conversation_id)
+    if after is not None:
+        stmt = stmt.filter(db.Message.created_at > after)
+    result = await session.execute(
+        stmt.order_by(db.Message.created_at.desc()).limit(limit)
+    )
+    # Return in chronological order
+    return list(reversed(result.scalars().all()))
+
+
+async def get_relevant_memories(
+    session: AsyncSession, user_id: str, conversation_id: uuid.UUID, query: str, limit: int = 3,
+    ef_search: int | None = None, probes: int | None = None,
+    query_embedding: list[float] | None = None
+):
+    if query_embedding is None:
+        query_embedding = await embedding_service.embed_query(query)
+    await db.apply_vector_search_params(session, ef_search=ef_search, probes=probes)
+    result = await session.execute(
+        select(db.Message.content)
+        .join(db.MemoryEmbedding, db.Message.id == db.MemoryEmbedding.message_id)
+        .filter(db.MemoryEmbedding.user_id == user_id, db.MemoryEmbedding.conversation_id == conversation_id)
+        .order_by(db.MemoryEmbedding.content_embedding.l2_distance(query_embedding))
+        .limit(limit)
+    )
+    return [row[0] for row in result.all()]
+
+
+@dataclass
+class RetrievedChunk:
+    id: uuid.UUID
+    document_id: uuid.UUID
+    content: str
+    page_number: str | None = None
+    score: float = 0.0
+    embedding: list[float] | None = field(default=None, repr=False)
+
+
+async def search_document_chunks(
+    session: AsyncSession,
+    query: str,
+    limit: int = 5,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    query_embedding: list[float] | None = None
+) -> list[RetrievedChunk]:
+    """Ambil chunk dokumen yang relevan berdasarkan query, beserta id chunk & dokumennya"""
+
+    print(f"🔍 RAG DEBUG: Searching for chunks with query: '{query}'")
+
+    try:
+        if query_embedding is None:
+            query_embedding = await embedding_service.embed_query(query)
+        print(f"🔍 RAG DEBUG: Query embedding created, length: {len(query_embedding)}")
+
+        # Tuning ANN (hnsw.ef_search / ivfflat.probes) khusus query ini
+        await db.apply_vector_search_params(session, ef_search=ef_search, probes=probes)
+
+        result = await session.execute(
+            select(
+                DocumentChunk.id,
+                DocumentChunk.document_id,
+                DocumentChunk.content,
+                DocumentChunk.page_number,
+                DocumentChunk.content_embedding,
+            )
+            .join(Document, DocumentChunk.document_id == Document.id)
+            .filter(Document.is_active == True)
+            .order_by(DocumentChunk.content_embedding.l2_distance(query_embedding))
+            .limit(limit)
+        )
+
+        chunks = [
+            RetrievedChunk(chunk_id, document_id, content, page_number, embedding=embedding)
+            for chunk_id, document_id, content, page_number, embedding in result.all()
+        ]
+        print(f"🔍 RAG DEBUG: Found {len(chunks)} chunks")
+        if chunks:
+            print(f"🔍 RAG DEBUG: First chunk preview: {chunks[0].content[:100]}...")
+        else:
+            print("🔍 RAG DEBUG: No chunks found!")
+
+        return chunks
+
+    except Exception as e:
+        print(f"🔍 RAG DEBUG: Error in search_document_chunks: {e}")
+        return []
+
+
+# Kata umum (ID/EN) yang dengan config 'simple' cocok dengan hampir semua chunk
+LEXICAL_STOPWORDS = frozenset("""
+    yang dan di ke dari untuk dengan pada ini itu adalah ialah atau juga dalam akan tidak
+    ada apa apakah bagaimana berapa kapan mana siapa mengapa kenapa saya aku kami kita anda
+    kamu bisa dapat oleh sebagai karena jika kalau agar supaya tentang seperti sudah belum
+    harus lebih para tersebut secara serta namun tetapi hanya saja per mohon tolong jelaskan
+    the a an and or of to in on for with is are was were be been by at as it its this that
+    these those what how which who whom when where why do does did can could i you me my
+    we our your from about into than then there please
+""".split())
+
+
+def _lexical_terms(query: str) -> str:
+    words = re.findall(r"[\w-]+", query.lower())
+    kept = [word for word in words if word not in LEXICAL_STOPWORDS]
+    # Pertanyaan yang seluruhnya kata umum tetap dicari apa adanya
+    return " ".join(kept or words)
+
+
+def _lexical_tsquery(terms: str, match_any: bool = False):
+    config = literal_column(f"'{db.FTS_CONFIG}'::regconfig")
+    tsquery = func.plainto_tsquery(config, terms)
+    if not match_any:
+        return tsquery
+    # plainto_tsquery meng-AND semua kata; untuk fallback operatornya diganti OR
+    # dan ts_rank_cd yang menentukan urutan
+    return cast(func.replace(cast(tsquery, Text), "&", "|"), TSQUERY)
+
+
+async def _lexical_query(session: AsyncSession, tsquery, limit: int) -> list[RetrievedChunk]:
+    rank = func.ts_rank_cd(DocumentChunk.content_tsv, tsquery)
+    result = await session.execute(
+        select(
+            DocumentChunk.id,
+            DocumentChunk.document_id,
+            DocumentChunk.content,
+            DocumentChunk.page_number,
+            rank,
+            DocumentChunk.content_embedding,
+        )
+        .join(Document, DocumentChunk.document_id == Document.id)
+        .filter(Document.is_active == True, DocumentChunk.content_tsv.op("@@")(tsquery))
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+    return [
+        RetrievedChunk(chunk_id, document_id, content, page_number, score, embedding=embedding)
+        for chunk_id, document_id, content, page_number, score, embedding in result.all()
+    ]
+
+
+async def lexical_search_chunks(
+    session: AsyncSession, query: str, limit: int = 5
+) -> list[RetrievedChunk]:
+    """Full-text search atas content_tsv (index GIN); tidak butuh embedding.
+
+    Stopword dibuang lalu semua kata harus muncul (AND); bila tidak ada chunk
+    yang cocok, pencarian dilonggarkan menjadi OR atas kata yang tersisa.
+    """
+    try:
+        terms = _lexical_terms(query)
+        if not terms:
+            return []
+        chunks = await _lexical_query(session, _lexical_tsquery(terms), limit)
+        if not chunks and " " in terms:
+            chunks = await _lexical_query(session, _lexical_tsquery(terms, match_any=True), limit)
+        print(f"🔍 RAG DEBUG: Lexical search found {len(chunks)} chunks")
+        return chunks
+    except Exception as e:
+        print(f"🔍 RAG DEBUG: Error in lexical_search_chunks: {e}")
+        return []
+
+
+def select_chunks(
+    query_embedding: list[float] | None, candidates: list[RetrievedChunk], limit: int
+) -> list[RetrievedChunk]:
+    """Tahap akhir retrieval: rerank lokal (cosine + MMR, dedupe, token budget) atau top-k biasa."""
+    if not rerank.RERANK_ENABLED:
+        return candidates[:limit]
+    selected = rerank.rerank(query_embedding, candidates, limit)
+    print(f"🔍 RAG DEBUG: Reranked {len(candidates)} candidates -> {len(selected)} chunks")
+    return selected
+
+
+def rrf_fuse(rankings: list[list[RetrievedChunk]], limit: int, k: int = RRF_K) -> list[RetrievedChunk]:
+    """Gabungkan beberapa daftar peringkat dengan reciprocal rank fusion."""
+    fused: dict[uuid.UUID, RetrievedChunk] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            entry = fused.setdefault(chunk.id, RetrievedChunk(
+                chunk.id, chunk.document_id, chunk.content, chunk.page_number
+            ))
+            entry.score += 1.0 / (k + rank)
+            if entry.embedding is None:
+                entry.embedding = chunk.embedding
+    return sorted(fused.values(), key=lambda chunk: chunk.score, reverse=True)[:limit]
+
+
+async def hybrid_search_chunks(
+    session: AsyncSession,
+    query: str,
+    limit: int = 5,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    query_embedding: list[float] | None = None,
+    mode: str = RETRIEVAL_MODE,
+    candidates: int = HYBRID_CANDIDATES,
+) -> list[RetrievedChunk]:
+    """Retrieval chunk sesuai RETRIEVAL_MODE; bila embedding gagal, pakai hasil leksikal saja.
+
+    Kandidat diambil berlebih (`candidates`) lalu dipilih ulang oleh select_chunks.
+    """
+    candidates = max(candidates, limit)
+    lexical = await lexical_search_chunks(session, query, candidates) if mode != "vector" else []
+    if mode == "lexical":
+        return select_chunks(query_embedding, lexical, limit)
+    if query_embedding is None:
+        try:
+            query_embedding = await embedding_service.embed_query(query)
+        except EmbeddingUnavailable as e:
+            print(f"🔍 RAG DEBUG: Embedding unavailable, lexical only: {e}")
+            return select_chunks(None, lexical, limit)
+    vector = await search_document_chunks(
+        session, query, limit=candidates, ef_search=ef_search, probes=probes,
+        query_embedding=query_embedding,
+    )
+    if mode == "vector":
+        return select_chunks(query_embedding, vector, limit)
+    return select_chunks(query_embedding, rrf_fuse([vector, lexical], candidates), limit)
+
+
+async def get_relevant_document_chunks(
+    session: AsyncSession,
+    query: str,
+    limit: int = 5,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    query_embedding: list[float] | None = None
+) -> list[str]:
+    """Ambil isi chunk dokumen yang relevan berdasarkan query"""
+    chunks = await hybrid_search_chunks(
+        session, query, limit=limit, ef_search=ef_search, probes=probes,
+        query_embedding=query_embedding,
+    )
+    return [chunk.content for chunk in chunks]
+
+
+@dataclass
+class RetrievalResult:
+    history: list = field(default_factory=list)
+    memories: list[str] = field(default_factory=list)
+    chunks: list[RetrievedChunk] = field(default_factory=list)
+    query_embedding: list[float] | None = None
+    timings: dict[str, float] = field(default_factory=dict)  # ms per tahap
+    degraded: list[str] = field(default_factory=list)  # tahap yang gagal/timeout
+
+    @property
+    def document_chunks(self) -> list[str]:
+        return [chunk.content for chunk in self.chunks]
+
+
+async def retrieve_context(
+    user_id: str,
+    conversation_id: uuid.UUID,
+    query: str,
+    history_limit: int = 10,
+    memory_limit: int = 1,
+    chunk_limit: int = 3,
+    timeout: float = RETRIEVAL_STAGE_TIMEOUT,
+    history_after: datetime | None = None,
+) -> RetrievalResult:
+    """Jalankan history, memory, dan document search secara paralel.
+
+    Tiap tahap memakai session (koneksi pool) sendiri dan embedding query yang sama.
+    Document search menggabungkan hasil vektor dan full-text (RETRIEVAL_MODE).
+    Tahap yang gagal atau timeout hanya menghasilkan konteks kosong.
+    """
+    result = RetrievalResult()
+    started = time.perf_counter()
+
+    async def timed(name, coro, budget=timeout):
+        stage_start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, budget)
+        except asyncio.CancelledError as e:
+            # Pembatalan dari luar (mis. klien pergi) tetap diteruskan; selain itu
+            # CancelledError berasal dari tahap lain dan cukup dianggap degraded
+            if asyncio.current_task().cancelling():
+                raise
+            result.degraded.append(name)
+            print(f"⚠️ RETRIEVAL: tahap '{name}' dilewati: {type(e).__name__}")
+            return None
+        except Exception as e:
+            result.degraded.append(name)
+            print(f"⚠️ RETRIEVAL: tahap '{name}' dilewati: {type(e).__name__}: {e}")
+            return None
+        finally:
+            result.timings[name] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+    embedding_task = asyncio.ensure_future(
+        timed("embedding", embedding_service.embed_query(query))
+    )
+
+    async def history_stage():
+        async with async_session() as session:
+            return await get_chat_history(
+                session, conversation_id, limit=history_limit, after=history_after
+            )
+
+    async def memories_stage():
+        # shield: timeout tahap ini tidak boleh membatalkan embedding milik tahap lain
+        query_embedding = await asyncio.shield(embedding_task)
+        if query_embedding is None or memory_limit <= 0:
+            return []
+        async with async_session() as session:
+            return await get_relevant_memories(
+                session, user_id, conversation_id, query, limit=memory_limit,
+                query_embedding=query_embedding,
+            )
+
+    async def lexical_stage(candidates):
+        async with async_session() as session:
+            return await lexical_search_chunks(session, query, limit=candidates)
+
+    async def documents_stage():
+        if chunk_limit <= 0:
+            return []
+        candidates = max(chunk_limit, HYBRID_CANDIDATES)
+        # Full-text search tidak menunggu embedding, jadi jalan bersamaan dengannya
+        lexical_task = (
+            asyncio.ensure_future(lexical_stage(candidates)) if RETRIEVAL_MODE != "vector" else None
+        )
+        try:
+            vector, query_embedding = [], None
+            if RETRIEVAL_MODE != "lexical":
+                query_embedding = await asyncio.shield(embedding_task)
+                if query_embedding is not None:
+                    async with async_session() as session:
+                        vector = await search_document_chunks(
+                            session, query, limit=candidates, query_embedding=query_embedding
+                        )
+            if lexical_task is None:
+                return select_chunks(query_embedding, vector, chunk_limit)
+            lexical = await lexical_task
+            if not vector:
+                # Embedding gagal/timeout (atau mode lexical): cukup hasil leksikal
+                return select_chunks(query_embedding, lexical, chunk_limit)
+            return select_chunks(
+                query_embedding, rrf_fuse([vector, lexical], candidates), chunk_limit
+            )
+        finally:
+            if lexical_task is not None and not lexical_task.done():
+                lexical_task.cancel()
+
+    try:
+        history, memories, chunks = await asyncio.gather(
+            timed("history", history_stage()),
+            # Memories & documents menunggu embedding (dibatasi timeout sendiri) lalu
+            # query DB: budget dua tahap agar fallback leksikal sempat jalan
+            timed("memories", memories_stage(), 2 * timeout),
+            timed("documents", documents_stage(), 2 * timeout),
+        )
+    except asyncio.CancelledError:
+        embedding_task.cancel()
+        raise
+    result.query_embedding = await asyncio.shield(embedding_task)
+
+    result.history = history or []
+    result.memories = memories or []
+    result.chunks = chunks or []
+    result.timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"⏱️ RETRIEVAL: {result.timings} degraded={result.degraded}")
+    return result
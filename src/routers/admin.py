@@ -1,25 +1,41 @@
 import os
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
-from pypdf import PdfReader
 
-from .. import schemas, services, database as db
+from .. import schemas, services, jobs, summarization, uploads, database as db
+from ..response_cache import response_cache
+from ..memory_writer import memory_buffer
+from ..tasks import task_supervisor
+from ..auth_cache import principal_cache
+from ..passwords import password_hasher
 from .auth import get_current_admin, require_roles # Import dependencies from auth router
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
 
 # Endpoint upload dokumen untuk admin
-@router.post("/upload", response_model=schemas.DocumentOut)
+@router.post(
+    "/upload",
+    response_model=schemas.IngestionJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def upload_document(
     file: UploadFile = File(...),
+    replace_document_id: uuid.UUID | None = Form(None),
     admin=Depends(get_current_admin),
     session: AsyncSession = Depends(db.get_db),
 ):
-    """Upload dan proses dokumen PDF untuk RAG"""
+    """Upload dokumen PDF; parsing dan embedding dijalankan oleh job di background.
+
+    File disalin ke disk per potongan. PDF yang isinya identik dengan dokumen
+    yang sudah ada tidak di-embed ulang: job dokumen lama yang dikembalikan
+    dan dokumen itu diaktifkan lagi bila sempat dinonaktifkan.
+    Dengan `replace_document_id` file menjadi versi baru dokumen tersebut:
+    hanya chunk yang berubah yang di-embed (lihat `embeddings_reused` di job).
+    """
     
     # Validasi file
     if not file.filename.lower().endswith('.pdf'):
@@ -28,36 +44,91 @@ async def upload_document(
             detail="Hanya file PDF yang diperbolehkan"
         )
     
-    # Buat nama file yang unik
-    file_extension = file.filename.split('.')[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    
-    # Simpan file
-    uploads_dir = os.path.join(os.path.dirname(__file__), "..", "uploads")
-    os.makedirs(uploads_dir, exist_ok=True)
-    file_path = os.path.join(uploads_dir, unique_filename)
-    
+    previous = None
+    if replace_document_id:
+        result = await session.execute(select(db.Document).filter_by(id=replace_document_id))
+        previous = result.scalars().first()
+        if not previous:
+            raise HTTPException(status_code=404, detail="Document to replace not found")
+
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Proses PDF dengan RAG
-        document = await services.process_pdf_document(
-            session, file_path, file.filename, admin.id
+        stored = await uploads.store_upload(file)
+    except uploads.UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gagal menyimpan file: {str(e)}")
+
+    existing, existing_job = await services.find_document_by_hash(session, stored.sha256)
+    if existing is not None:
+        await uploads.discard_upload(stored.path)
+        replaced = previous if previous is not None and previous.id != existing.id else None
+        if existing_job is not None and existing_job.status != "failed":
+            print(f"♻️ UPLOAD: {file.filename} identik dengan dokumen {existing.id}, tidak di-embed ulang")
+            if existing_job.status == "done":
+                # Dokumen lama bisa saja sudah dinonaktifkan (PATCH atau digantikan versi
+                # lain): upload ulang/rollback berarti dokumen itu harus dicari lagi
+                existing.is_active = True
+                if replaced is not None:
+                    replaced.is_active = False
+                await session.commit()
+                if replaced is not None:
+                    response_cache.invalidate_document(replaced.id)
+            return existing_job
+        # Ingest sebelumnya gagal: proses ulang file dokumen yang sudah tersimpan
+        existing.is_active = True
+        job = db.IngestionJob(
+            document_id=existing.id, status="queued",
+            replaces_document_id=replaced.id if replaced else None,
         )
-        
-        return document
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+        await jobs.ingestion_queue.enqueue(job.id)
+        return job
+
+    try:
+        document = await services.create_document(
+            session, stored.path, file.filename, admin.id,
+            file_size=stored.size, content_hash=stored.sha256,
+        )
+        job = db.IngestionJob(
+            document_id=document.id, status="queued",
+            replaces_document_id=previous.id if previous else None,
+        )
+        if previous:
+            # Judul yang sudah diubah admin ikut ke versi baru
+            document.title = previous.title
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
         
     except Exception as e:
         # Cleanup jika gagal
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        await uploads.discard_upload(stored.path)
         raise HTTPException(
             status_code=500,
             detail=f"Gagal memproses file: {str(e)}"
         )
 
+    await jobs.ingestion_queue.enqueue(job.id)
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestionJobOut)
+async def get_ingestion_job(
+    job_id: uuid.UUID,
+    admin=Depends(get_current_admin),
+    session: AsyncSession = Depends(db.get_db),
+):
+    """Status dan progres job ingest dokumen"""
+    result = await session.execute(
+        select(db.IngestionJob).filter_by(id=job_id)
+    )
+    job = result.scalars().first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/documents", response_model=list[schemas.DocumentOut])
 async def list_documents(
     admin=Depends(get_current_admin),
@@ -101,10 +172,96 @@ async def delete_document(
     # Hapus dari database (cascade akan hapus chunks)
     await session.delete(document)
     await session.commit()
+
+    # Jawaban yang bersumber dari dokumen ini tidak boleh dipakai lagi
+    response_cache.invalidate_document(document_id)
     
     return {"message": "Document deleted successfully"}
 
 
+@router.patch("/documents/{document_id}", response_model=schemas.DocumentOut)
+async def update_document(
+    document_id: uuid.UUID,
+    payload: schemas.DocumentUpdate,
+    admin=Depends(get_current_admin),
+    session: AsyncSession = Depends(db.get_db),
+):
+    """Ubah judul atau aktif/nonaktifkan dokumen untuk RAG"""
+    result = await session.execute(
+        select(db.Document).filter_by(id=document_id)
+    )
+    document = result.scalars().first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if payload.title is not None:
+        document.title = payload.title
+    if payload.is_active is not None:
+        document.is_active = payload.is_active
+    await session.commit()
+    await session.refresh(document)
+
+    if not document.is_active:
+        response_cache.invalidate_document(document_id)
+    return document
+
+
+# Status rebuild index terakhir di proses ini (lihat GET /indexes/rebuild)
+_index_rebuild: dict = {"status": "idle", "rebuilt": [], "error": None}
+_index_rebuild_future = None
+
+
+async def _rebuild_indexes_job():
+    _index_rebuild.update(status="running", rebuilt=[], error=None)
+    try:
+        rebuilt = await db.rebuild_vector_indexes_online()
+    except Exception as e:
+        _index_rebuild.update(status="failed", error=str(e))
+        raise
+    _index_rebuild.update(status="done", rebuilt=rebuilt)
+
+
+@router.post("/indexes/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_vector_indexes(admin=Depends(get_current_admin)):
+    """Bangun ulang index ANN embedding di background (mis. IVFFlat setelah banyak dokumen baru).
+
+    Index dibangun CONCURRENTLY sehingga pencarian dan insert tetap berjalan
+    selama build; pantau hasilnya lewat GET /indexes/rebuild.
+    """
+    global _index_rebuild_future
+    if _index_rebuild_future is not None and not _index_rebuild_future.done():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Index rebuild already running")
+    _index_rebuild.update(status="queued", rebuilt=[], error=None)
+    _index_rebuild_future = task_supervisor.submit("rebuild_vector_indexes", _rebuild_indexes_job, retries=0)
+    if _index_rebuild_future.done():
+        # Ditolak supervisor (antrian penuh / shutdown)
+        _index_rebuild.update(status="failed", error=str(_index_rebuild_future.exception()))
+    return {"index_type": db.VECTOR_INDEX_TYPE, **_index_rebuild}
+
+
+@router.get("/indexes/rebuild")
+async def get_index_rebuild_status(admin=Depends(get_current_admin)):
+    """Status rebuild index vektor terakhir yang dijalankan proses ini"""
+    return {"index_type": db.VECTOR_INDEX_TYPE, **_index_rebuild}
+
+
+@router.get("/metrics")
+async def get_metrics(admin=Depends(get_current_admin)):
+    """Metrik runtime (cache, antrian, dll) untuk monitoring"""
+    return {
+        "embedding_cache": services.embedding_service.cache.stats(),
+        "embedding_client": services.embedding_service.stats(),
+        "response_cache": response_cache.stats(),
+        "llm_calls": summarization.llm_call_stats(),
+        "memory_writer": memory_buffer.stats(),
+        "background_tasks": task_supervisor.stats(),
+        "auth_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "streams": services.stream_stats(),
+        "database": db.pool_stats(),
+    }
+
+
 @router.get(
     "/users",
     response_model=list[schemas.UserOut],
@@ -133,16 +290,21 @@ async def admin_update_user(
     user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    old_username = user.username
     if payload.username:
         user.username = payload.username
     if payload.password:
-        user.password_hash = db.User.get_password_hash(payload.password)
+        user.password_hash = await password_hasher.hash(payload.password)
     if payload.role:
         user.role = payload.role
     if payload.is_active is not None:
         user.is_active = payload.is_active
+    if payload.username or payload.password or payload.role or payload.is_active is not None:
+        # Token yang sudah terbit membawa username/role lama: cabut semuanya
+        user.token_version = (user.token_version or 0) + 1
     await session.commit()
     await session.refresh(user)
+    principal_cache.invalidate(old_username, user.username)
     return user
 
 
@@ -158,4 +320,5 @@ async def admin_delete_user(
         raise HTTPException(status_code=404, detail="User not found")
     await session.delete(user)
     await session.commit()
+    principal_cache.invalidate(user.username)
     return
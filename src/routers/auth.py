@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 
 from .. import schemas, services, database as db
+from ..passwords import password_hasher
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -39,10 +40,13 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = await services.get_user_by_username(session, username)
-    if user is None:
+    # Principal dari cache (atau klaim token di mode stateless); DB hanya saat miss
+    principal = await services.resolve_principal(session, payload)
+    if principal is None:
         raise credentials_exception
-    return user
+    if not principal.is_active:
+        raise HTTPException(status_code=401, detail="Inactive user")
+    return principal
 
 
 # General RBAC dependency
@@ -77,7 +81,7 @@ async def register_user(
         raise HTTPException(status_code=400, detail="Username already registered")
     user_obj = User(
         username=user.username,
-        password_hash=User.get_password_hash(user.password),
+        password_hash=await password_hasher.hash(user.password),
         role=user.role or "user",
     )
     session.add(user_obj)
@@ -100,7 +104,7 @@ async def login(
             status_code=401, detail="Incorrect username or password"
         )
     access_token = services.create_access_token(
-        data={"sub": user.username, "role": user.role}
+        data=services.access_token_claims(user)
     )
 
     # Set HTTP-only cookie for browser access; token still returned in body for JS usage
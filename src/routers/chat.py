@@ -1,14 +1,13 @@
 import uuid
 import time
 import logging
-import asyncio
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
 from .. import schemas, services, database as db
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, split_page
 
 router = APIRouter(tags=["Chat & Conversations"])
 
@@ -23,41 +22,70 @@ async def chat(
 
 @router.post("/chat/stream")
 async def chat_stream(
-    chat_request: schemas.ChatRequest, session: AsyncSession = Depends(db.get_db)
+    chat_request: schemas.ChatRequest,
+    request: Request,
+    format: str = Query("text", pattern="^(text|sse)$"),
 ):
-    # Dapatkan atau buat percakapan di sini untuk mendapatkan ID-nya
-    conversation = await services.get_or_create_conversation(
-        session, chat_request.user_id, chat_request.conversation_id
-    )
+    """Stream jawaban. `format=sse` (atau Accept: text/event-stream) memakai
+    Server-Sent Events bertipe; default text/plain untuk klien lama."""
+    # Percakapan + pesan user ditulis dalam satu transaksi untuk mendapatkan ID-nya.
+    # Session sengaja tidak dari Depends(get_db): tidak boleh hidup selama stream.
+    async with db.async_session() as session:
+        turn = await services.begin_turn(session, chat_request)
+    conversation = turn[0]
 
     # Perbarui chat_request dengan conversation.id yang pasti ada
     chat_request.conversation_id = conversation.id
 
-    generator = services.stream_chat_response(session, chat_request)
-
     # Tambahkan header X-Conversation-Id
-    return StreamingResponse(
-        generator,
-        media_type="text/plain",
-        headers={"X-Conversation-Id": str(conversation.id)},
+    headers = {"X-Conversation-Id": str(conversation.id)}
+    if format == "sse" or "text/event-stream" in request.headers.get("accept", ""):
+        generator = services.stream_chat_sse(
+            chat_request, turn=turn, is_disconnected=request.is_disconnected
+        )
+        # Matikan buffering proxy (nginx) agar event langsung sampai ke browser
+        headers.update({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        return StreamingResponse(generator, media_type="text/event-stream", headers=headers)
+
+    generator = services.stream_chat_response(
+        chat_request, turn=turn, is_disconnected=request.is_disconnected
     )
+    return StreamingResponse(generator, media_type="text/plain", headers=headers)
 
 
 # CRUD Conversation endpoints
-@router.get("/conversations", response_model=list[schemas.ConversationOut])
+@router.get("/conversations", response_model=schemas.ConversationPage)
 async def list_conversations(
     user_id: str,
-    skip: int = 0,
-    limit: int = 20,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     session: AsyncSession = Depends(db.get_db),
 ):
+    """Percakapan user, terbaru dulu. Kirim `next_cursor` sebagai `cursor` untuk halaman berikutnya."""
     start_time = time.time()
-    result = await session.execute(
-        select(db.Conversation).filter_by(user_id=user_id).offset(skip).limit(limit)
-    )
-    conversations = result.scalars().all()
+    stmt = select(db.Conversation).filter_by(user_id=user_id)
+    try:
+        stmt = keyset_page(stmt, db.Conversation.created_at, db.Conversation.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await session.execute(stmt)
+    conversations, next_cursor = split_page(result.scalars().all(), limit)
     logging.info(f"/conversations executed in {time.time() - start_time:.3f}s")
-    return conversations
+    return {"items": conversations, "next_cursor": next_cursor}
+
+
+async def get_message_page(
+    session: AsyncSession, conversation_id: uuid.UUID, cursor: str | None, limit: int
+) -> tuple[list, str | None]:
+    """Halaman pesan (terbaru dulu di DB), dikembalikan dalam urutan kronologis."""
+    stmt = select(db.Message).filter_by(conversation_id=conversation_id)
+    try:
+        stmt = keyset_page(stmt, db.Message.created_at, db.Message.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await session.execute(stmt)
+    messages, next_cursor = split_page(result.scalars().all(), limit)
+    return list(reversed(messages)), next_cursor
 
 
 @router.post("/conversations", response_model=schemas.ConversationOut)
@@ -71,19 +99,19 @@ async def create_conversation_endpoint(
 
 @router.get("/conversations/{conversation_id}", response_model=schemas.ConversationDetail)
 async def get_conversation(
-    conversation_id: uuid.UUID, session: AsyncSession = Depends(db.get_db)
+    conversation_id: uuid.UUID,
+    message_limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(db.get_db),
 ):
     start_time = time.time()
     result = await session.execute(
-        select(db.Conversation)
-        .options(selectinload(db.Conversation.messages))
-        .filter_by(id=conversation_id)
+        select(db.Conversation).filter_by(id=conversation_id)
     )
     conversation = result.scalars().first()
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    # Get all messages for this conversation (sudah eager loaded)
-    messages = getattr(conversation, "messages", [])
+    # Hanya halaman pesan terbaru; pesan lama diambil lewat /messages?cursor=
+    messages, next_cursor = await get_message_page(session, conversation_id, None, message_limit)
     logging.info(
         f"/conversations/{{conversation_id}} executed in {time.time() - start_time:.3f}s"
     )
@@ -93,9 +121,21 @@ async def get_conversation(
         "summary": conversation.summary,
         "created_at": conversation.created_at,
         "messages": messages,
+        "next_cursor": next_cursor,
     }
 
 
+@router.get("/conversations/{conversation_id}/messages", response_model=schemas.MessagePage)
+async def list_messages(
+    conversation_id: uuid.UUID,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(db.get_db),
+):
+    messages, next_cursor = await get_message_page(session, conversation_id, cursor, limit)
+    return {"items": messages, "next_cursor": next_cursor}
+
+
 # FUNGSI YANG DIPERBAIKI UNTUK FITUR RENAME
 @router.put("/conversations/{conversation_id}", response_model=schemas.ConversationOut)
 async def update_conversation(
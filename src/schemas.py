@@ -62,6 +62,7 @@ class MessageOut(BaseModel):
     content: str
     created_at: datetime
     timezone: Optional[str] = None
+    is_truncated: bool = False
 
     class Config:
         from_attributes = True
@@ -77,12 +78,24 @@ class ConversationOut(BaseModel):
         from_attributes = True
 
 
+class ConversationPage(BaseModel):
+    items: List[ConversationOut]
+    next_cursor: Optional[str] = None
+
+
+class MessagePage(BaseModel):
+    # Urut kronologis; next_cursor menunjuk ke pesan yang lebih lama
+    items: List[MessageOut]
+    next_cursor: Optional[str] = None
+
+
 class ConversationDetail(BaseModel):
     id: uuid.UUID
     user_id: str
     summary: Optional[str]
     created_at: datetime
-    messages: List[MessageOut]
+    messages: List[MessageOut]  # halaman pesan terbaru saja
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -102,6 +115,10 @@ class DocumentBase(BaseModel):
 class DocumentCreate(DocumentBase):
     pass
 
+class DocumentUpdate(BaseModel):
+    title: Optional[str] = None
+    is_active: Optional[bool] = None
+
 class DocumentOut(DocumentBase):
     id: uuid.UUID
     uploaded_by: uuid.UUID
@@ -122,3 +139,18 @@ class DocumentChunkOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+class IngestionJobOut(BaseModel):
+    id: uuid.UUID
+    document_id: uuid.UUID
+    status: str
+    chunks_done: int
+    chunks_total: int
+    error: Optional[str] = None
+    replaces_document_id: Optional[uuid.UUID] = None
+    embeddings_reused: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -1,19 +1,52 @@
 import os
+import json
+import time
 import uuid
 import asyncio
+from collections import Counter
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable
 from jose import jwt
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pypdf import PdfReader
 from . import database as db
 from .database import async_session
 from . import schemas
-from .database import Document, DocumentChunk
+from . import ingestion
+from .embedding_client import embedding_service
+from .response_cache import response_cache
+from .memory_writer import memory_buffer
+from .tasks import task_supervisor
+from .passwords import password_hasher
+from .pdf_extract import pdf_extractor
+from .auth_cache import AUTH_STATELESS, Principal, principal_cache, principal_from_claims
+from .context_builder import (
+    HISTORY_FETCH_LIMIT,
+    PromptContext,
+    build_rag_context,
+    estimate_tokens,
+)
+from .summarization import (
+    digest_due,
+    fold_digest,
+    generate_summary,
+    generate_title_in_background,
+    has_title,
+    is_substantive_content,
+    record_llm_call,
+    start_turn_metrics,
+)
+from .retrieval import (
+    get_chat_history,
+    get_relevant_memories,
+    get_relevant_document_chunks,
+    retrieve_context,
+)
 
 # JWT config
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretkey")
@@ -25,21 +58,56 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     expire = datetime.utcnow() + (
         expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 async def authenticate_user(session: AsyncSession, username: str, password: str):
     result = await session.execute(select(db.User).filter_by(username=username))
     user = result.scalars().first()
-    if user and user.verify_password(password):
-        return user
-    return None
+    if not user or user.is_active is False:
+        return None
+    # bcrypt berjalan di pool worker, bukan di event loop
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not valid:
+        return None
+    if new_hash:
+        # BCRYPT_ROUNDS berubah: simpan hash dengan cost baru selagi password polosnya ada
+        user.password_hash = new_hash
+        await session.commit()
+    return user
 
 async def get_user_by_username(session: AsyncSession, username: str):
     result = await session.execute(select(db.User).filter_by(username=username))
     return result.scalars().first()
 
+def access_token_claims(user) -> dict:
+    # uid & role dipakai mode AUTH_STATELESS, ver untuk mencabut token lama
+    return {
+        "sub": user.username,
+        "uid": str(user.id),
+        "role": user.role,
+        "ver": user.token_version or 0,
+    }
+
+async def resolve_principal(session: AsyncSession, payload: dict) -> Principal | None:
+    """Principal untuk klaim token yang sudah diverifikasi; None bila tidak valid lagi."""
+    if AUTH_STATELESS:
+        principal = principal_from_claims(payload)
+        if principal is not None:
+            return principal
+    username, version = payload["sub"], int(payload.get("ver", 0))
+    principal = principal_cache.get(username, version)
+    if principal is None:
+        user = await get_user_by_username(session, username)
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        principal_cache.put(principal)
+    if principal.token_version != version:
+        return None
+    return principal
+
 # LangChain configuration
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
@@ -49,121 +117,114 @@ llm = ChatGoogleGenerativeAI(
     temperature=0.7
 )
 
-summary_llm = ChatGoogleGenerativeAI(
-    model=os.getenv("GEMINI_SUMMARY_MODEL", GEMINI_MODEL),
-    temperature=0.3
-)
-
-embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/embedding-001"
-)
-
 # Function to create embeddings
-def make_embedding(text: str):
-    return embeddings.embed_query(text)
+async def make_embedding(text: str):
+    return await embedding_service.embed_query(text)
 
 
 # Text splitter untuk chunking dokumen
 text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200,
+    chunk_size=ingestion.CHUNK_SIZE,
+    chunk_overlap=ingestion.CHUNK_OVERLAP,
     length_function=len,
     separators=["\n\n", "\n", " ", ""]
 )
 
 
 # RAG Functions
-async def process_pdf_document(
-    session: AsyncSession, 
-    file_path: str, 
-    filename: str, 
-    uploaded_by: uuid.UUID
+async def create_document(
+    session: AsyncSession,
+    file_path: str,
+    filename: str,
+    uploaded_by: uuid.UUID,
+    file_size: int | None = None,
+    content_hash: str | None = None,
 ) -> db.Document:
-    """Proses PDF dan simpan ke database dengan chunking yang proper"""
-    
-    # Baca PDF
-    reader = PdfReader(file_path)
-    
-    # Buat dokumen record
+    """Simpan record dokumen; chunk diproses terpisah oleh job ingest"""
+    if file_size is None:
+        file_size = os.path.getsize(file_path)
     document = db.Document(
         filename=filename,
         title=filename.replace('.pdf', ''),
         file_path=file_path,
-        file_size=f"{os.path.getsize(file_path)} bytes",
+        file_size=f"{file_size} bytes",
+        content_hash=content_hash,
         uploaded_by=uploaded_by
     )
     session.add(document)
     await session.commit()
     await session.refresh(document)
-    
-    # Proses setiap halaman
-    for page_num, page in enumerate(reader.pages, 1):
-        text = page.extract_text()
-        if not text.strip():
-            continue
-            
-        # Split text menjadi chunks
-        chunks = text_splitter.split_text(text)
-        
-        # Simpan setiap chunk
-        for chunk_idx, chunk in enumerate(chunks):
-            if not chunk.strip():
-                continue
-                
-            # Buat embedding
-            embedding = make_embedding(chunk)
-            
-            # Buat chunk record
-            chunk_record = db.DocumentChunk(
-                document_id=document.id,
-                chunk_index=f"page_{page_num}_chunk_{chunk_idx}",
-                content=chunk,
-                content_embedding=embedding,
-                page_number=str(page_num)
-            )
-            session.add(chunk_record)
-    
-    await session.commit()
     return document
 
-async def get_relevant_document_chunks(
-    session: AsyncSession, 
-    query: str, 
-    limit: int = 5
-) -> list[str]:
-    """Ambil chunk dokumen yang relevan berdasarkan query"""
-    
-    print(f"🔍 RAG DEBUG: Searching for chunks with query: '{query}'")
-    
-    try:
-        query_embedding = make_embedding(query)
-        print(f"🔍 RAG DEBUG: Query embedding created, length: {len(query_embedding)}")
-        
-        # Simplified query - just get all chunks first, then order by distance
-        result = await session.execute(
-            select(DocumentChunk.content, DocumentChunk.content_embedding)
-            .join(Document, DocumentChunk.document_id == Document.id)
-            .filter(Document.is_active == True)
-            .order_by(DocumentChunk.content_embedding.l2_distance(query_embedding))
-            .limit(limit)
-        )
-        
-        chunks = [row[0] for row in result.all()]
-        print(f"🔍 RAG DEBUG: Found {len(chunks)} chunks")
-        if chunks:
-            print(f"🔍 RAG DEBUG: First chunk preview: {chunks[0][:100]}...")
-        else:
-            print("🔍 RAG DEBUG: No chunks found!")
-            
-        return chunks
-        
-    except Exception as e:
-        print(f"🔍 RAG DEBUG: Error in get_relevant_document_chunks: {e}")
-        return []
 
+async def find_document_by_hash(
+    session: AsyncSession, content_hash: str
+) -> tuple[db.Document | None, db.IngestionJob | None]:
+    """Dokumen dengan isi file identik (jika ada) beserta job ingest terakhirnya."""
+    result = await session.execute(
+        select(db.Document)
+        .filter_by(content_hash=content_hash)
+        .order_by(db.Document.uploaded_at.desc())
+        .limit(1)
+    )
+    document = result.scalars().first()
+    if document is None:
+        return None, None
+    result = await session.execute(
+        select(db.IngestionJob)
+        .filter_by(document_id=document.id)
+        .order_by(db.IngestionJob.created_at.desc())
+        .limit(1)
+    )
+    return document, result.scalars().first()
+
+
+async def process_pdf_document(
+    session: AsyncSession,
+    document: db.Document,
+    progress=None,
+    previous_document_id: uuid.UUID | None = None,
+) -> ingestion.IngestResult:
+    """Proses PDF dan simpan chunk-nya ke database.
+
+    Bila `previous_document_id` diisi (upload versi baru), chunk yang isinya
+    sama dengan versi sebelumnya memakai embedding lama.
+    """
+
+    if progress:
+        await progress.stage("parsing")
+
+    reuse = None
+    if previous_document_id:
+        reuse = await load_chunk_embeddings(session, previous_document_id)
+
+    # Teks halaman diekstrak paralel di process pool dan mengalir ke tahap chunk + embed
+    pages = pdf_extractor.extract_pages(document.file_path)
+    result = await ingestion.ingest_pages(
+        session, document, pages, embedding_service, text_splitter,
+        progress=progress, reuse=reuse
+    )
+
+    await session.commit()
+    return result
+
+
+async def load_chunk_embeddings(
+    session: AsyncSession, document_id: uuid.UUID
+) -> dict[str, list[float]]:
+    """content_hash -> embedding untuk semua chunk sebuah dokumen."""
+    result = await session.execute(
+        select(db.DocumentChunk.content_hash, db.DocumentChunk.content_embedding)
+        .where(
+            db.DocumentChunk.document_id == document_id,
+            db.DocumentChunk.content_hash.is_not(None),
+        )
+    )
+    return {content_hash: embedding for content_hash, embedding in result.all()}
 
 async def get_or_create_conversation(
-    session: AsyncSession, user_id: str, conversation_id: uuid.UUID | None
+    session: AsyncSession, user_id: str, conversation_id: uuid.UUID | None,
+    commit: bool = True
 ) -> db.Conversation:
     if conversation_id:
         result = await session.execute(
@@ -173,51 +234,45 @@ async def get_or_create_conversation(
         if conversation:
             return conversation
 
-    # Create new conversation if not found
+    # Create new conversation if not found (created_at dibaca lewat RETURNING saat flush)
     new_conversation = db.Conversation(user_id=user_id)
     session.add(new_conversation)
-    await session.commit()
-    await session.refresh(new_conversation)
+    if commit:
+        await session.commit()
+    else:
+        await session.flush()
     return new_conversation
 
 
 async def add_message_to_db(
-    session: AsyncSession, conversation_id: uuid.UUID, role: str, content: str, timezone: str | None = None
+    session: AsyncSession, conversation_id: uuid.UUID, role: str, content: str, timezone: str | None = None,
+    commit: bool = True, is_truncated: bool = False
 ) -> db.Message:
     new_message = db.Message(
-        conversation_id=conversation_id, sender_role=role, content=content, timezone=timezone
+        conversation_id=conversation_id, sender_role=role, content=content, timezone=timezone,
+        is_truncated=is_truncated
     )
     session.add(new_message)
-    await session.commit()
-    await session.refresh(new_message)
+    if commit:
+        await session.commit()
+    else:
+        await session.flush()
     return new_message
 
 
-async def get_chat_history(
-    session: AsyncSession, conversation_id: uuid.UUID, limit: int = 10
-):
-    result = await session.execute(
-        select(db.Message)
-        .filter_by(conversation_id=conversation_id)
-        .order_by(db.Message.created_at.desc())
-        .limit(limit)
+async def begin_turn(
+    session: AsyncSession, chat_request: schemas.ChatRequest
+) -> tuple[db.Conversation, db.Message]:
+    """Transaksi pertama satu turn chat: percakapan (jika baru) + pesan user, sekali commit."""
+    conversation = await get_or_create_conversation(
+        session, chat_request.user_id, chat_request.conversation_id, commit=False
     )
-    # Return in chronological order
-    return list(reversed(result.scalars().all()))
-
-
-async def get_relevant_memories(
-    session: AsyncSession, user_id: str, conversation_id: uuid.UUID, query: str, limit: int = 3
-):
-    query_embedding = make_embedding(query)
-    result = await session.execute(
-        select(db.Message.content)
-        .join(db.MemoryEmbedding, db.Message.id == db.MemoryEmbedding.message_id)
-        .filter(db.MemoryEmbedding.user_id == user_id, db.MemoryEmbedding.conversation_id == conversation_id)
-        .order_by(db.MemoryEmbedding.content_embedding.l2_distance(query_embedding))
-        .limit(limit)
+    user_message = await add_message_to_db(
+        session, conversation.id, "user", chat_request.message, chat_request.timezone,
+        commit=False
     )
-    return [row[0] for row in result.all()]
+    await session.commit()
+    return conversation, user_message
 
 
 # LangChain prompt templates
@@ -251,59 +306,8 @@ Pesan pengguna: {user_message}
 Berikan respons yang membantu, relevan, dan sesuai dengan konteks percakapan di atas.""")
 ])
 
-summary_prompt = ChatPromptTemplate.from_messages([
-    ("system", """Kamu adalah ahli dalam membuat judul yang ringkas dan informatif. Tugas kamu adalah membuat satu judul singkat (maksimal 7 kata) yang paling relevan dan mewakili konteks percakapan.
-
-Panduan:
-- Gunakan kata-kata yang spesifik dan deskriptif
-- Hindari kata-kata umum seperti "percakapan" atau "chat"
-- Fokus pada topik utama yang dibahas
-- Gunakan bahasa Indonesia yang baik
-- Jangan tambahkan tanda kutip atau format khusus
-- Hanya berikan judul saja, tanpa penjelasan tambahan
-
-Contoh judul yang baik:
-- "Cara Membuat Website dengan React"
-- "Tips Investasi Saham untuk Pemula"
-- "Resep Masakan Nusantara"
-- "Troubleshooting Laptop Lambat"
-
-Contoh judul yang kurang baik:
-- "Percakapan tentang teknologi"
-- "Chat dengan asisten"
-- "Pertanyaan dan jawaban"""),
-    ("human", "Buatkan judul untuk percakapan berikut:\n\n{chat_content}")
-])
-
-substantive_prompt = ChatPromptTemplate.from_messages([
-    ("system", """Kamu adalah sistem yang mengevaluasi apakah konten percakapan cukup substantif untuk dibuatkan ringkasan yang bermakna.
-
-Kriteria konten SUBSTANTIF (jawab 'YES'):
-- Berisi pertanyaan spesifik yang memerlukan penjelasan
-- Membahas topik atau konsep tertentu
-- Meminta saran, rekomendasi, atau bantuan teknis
-- Berisi informasi atau pengetahuan yang bisa diringkas
-- Memiliki nilai edukatif atau informatif
-
-Kriteria konten TIDAK SUBSTANTIF (jawab 'NO'):
-- Salam atau ucapan sederhana (halo, selamat pagi, dll)
-- Ucapan terima kasih tanpa konteks tambahan
-- Konfirmasi sederhana (ok, baik, setuju)
-- Emoji atau reaksi tanpa teks
-- Pesan yang terlalu pendek dan tidak informatif
-
-Instruksi:
-- Analisis konten dengan cermat
-- Pertimbangkan konteks dan nilai informatif
-- Jawab hanya dengan 'YES' atau 'NO'
-- Tidak ada penjelasan tambahan"""),
-    ("human", "Evaluasi apakah konten berikut substantif untuk dibuatkan ringkasan:\n\n{content}")
-])
-
 # Create LangChain chains
 chat_chain = LLMChain(llm=llm, prompt=chat_prompt)
-summary_chain = LLMChain(llm=summary_llm, prompt=summary_prompt)
-substantive_chain = LLMChain(llm=summary_llm, prompt=substantive_prompt)
 
 # Update chat prompt untuk include dokumen
 rag_chat_prompt = ChatPromptTemplate.from_messages([
@@ -344,155 +348,109 @@ Berikan respons yang membantu, relevan, dan sesuai dengan konteks percakapan di
 # Create RAG chat chain
 rag_chat_chain = LLMChain(llm=llm, prompt=rag_chat_prompt)
 
-async def is_substantive_content(content: str) -> bool:
-    """Uses LangChain to determine if the content is substantive enough for a summary."""
-    try:
-        result = await asyncio.wait_for(
-            substantive_chain.arun(content=content), timeout=5
-        )
-        result = result.strip().upper()
-        return result == "YES"
-    except Exception as e:
-        return False
+# Ukuran template rag_chat_prompt tanpa isi (system prompt + teks tetap)
+RAG_PROMPT_FIXED_TOKENS = estimate_tokens(
+    rag_chat_prompt.format(document_context="", memories_text="", chat_history="", user_message="")
+)
 
 
-async def generate_summary(
-    session, conversation, user_message_content: str = None
-):
-    # Use LangChain to check if current message is substantive
-    is_current_message_substantive = await is_substantive_content(user_message_content)
-
-    # Case 1: A meaningful summary already exists. Do not update.
-    if (
-        conversation.summary
-        and conversation.summary.strip() != ""
-        and conversation.summary.strip().lower() != "new conversation"
-    ):
-        return conversation.summary
+def build_prompt_context(
+    context, chat_request: schemas.ChatRequest, conversation, user_message
+) -> PromptContext:
+    """Input rag_chat_prompt dalam batas PROMPT_TOKEN_BUDGET (dipakai chat & stream).
+
+    History hanya berisi pesan setelah digest; pesan yang lebih lama diwakili digest.
+    """
+    return build_rag_context(
+        context.history,
+        context.memories,
+        context.document_chunks,
+        chat_request.message,
+        exclude_message_id=user_message.id,
+        fixed_tokens=RAG_PROMPT_FIXED_TOKENS,
+        digest=conversation.digest,
+    )
 
-    # Case 2: Conversation is new AND current message is NOT substantive.
-    if not is_current_message_substantive and (
-        not conversation.summary
-        or conversation.summary.strip().lower() == "new conversation"
-    ):
-        if not conversation.summary or conversation.summary.strip() == "":
-            conversation.summary = "New Conversation"
-            await session.commit()
-        return conversation.summary
-
-    # Case 3: Conversation is new AND current message IS substantive.
-    if (
-        not conversation.summary
-        or conversation.summary.strip().lower() == "new conversation"
-    ) and is_current_message_substantive:
-        try:
-            all_msgs = await get_chat_history(session, conversation.id, limit=100)
 
-            # Use LangChain to check if the entire history is substantive
-            chat_lines = " | ".join(
-                [f"{msg.sender_role}: {msg.content}" for msg in all_msgs]
-            )
-            is_history_substantive = await is_substantive_content(chat_lines)
+# Streaming: token kecil dari LLM digabung sebelum dikirim ke klien
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "48"))
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
+# Lama menunggu judul percakapan sebelum event summary dikirim (mode SSE)
+STREAM_SUMMARY_WAIT = float(os.getenv("STREAM_SUMMARY_WAIT", "5"))
 
-            if not is_history_substantive:
-                conversation.summary = "New Conversation"
-                await session.commit()
-                return conversation.summary
+# Metrik stream: started/completed/cancelled/errors dan karakter jawaban yang terpotong
+stream_totals: Counter = Counter()
 
-            # Generate summary using LangChain
-            new_summary = await asyncio.wait_for(
-                summary_chain.arun(chat_content=chat_lines), timeout=10
-            )
-            new_summary = new_summary.strip().replace("\n", " ")
-
-            if new_summary and new_summary.strip() != "":
-                conversation.summary = new_summary
-                await session.commit()
-                return new_summary
-            else:
-                if not conversation.summary:
-                    conversation.summary = "New Conversation"
-                    await session.commit()
-                return conversation.summary
 
-        except Exception as e:
-            if not conversation.summary:
-                conversation.summary = "New Conversation"
-                await session.commit()
-            return conversation.summary
+def stream_stats() -> dict:
+    started = stream_totals["started"]
+    return {
+        **{key: stream_totals[key] for key in ("started", "completed", "cancelled", "errors")},
+        "truncated_chars": stream_totals["truncated_chars"],
+        "cancel_rate": round(stream_totals["cancelled"] / started, 3) if started else 0.0,
+    }
 
-    # Fallback: If none of the above conditions are met, return the current summary.
-    return conversation.summary
 
+def schedule_digest(conversation, context):
+    """Lipat history lama ke digest di background bila sudah cukup banyak pesan baru."""
+    # History yang diambil = pesan setelah digest_through, + 1 jawaban assistant turn ini
+    if digest_due(len(context.history) + 1):
+        task_supervisor.submit("fold_digest", fold_digest, conversation.id)
 
 
 async def generate_chat_response(
     session: AsyncSession, chat_request: schemas.ChatRequest
 ) -> schemas.ChatResponse:
-    conversation = await get_or_create_conversation(
-        session, chat_request.user_id, chat_request.conversation_id
-    )
-    
-    user_message = await add_message_to_db(
-        session, conversation.id, "user", chat_request.message, chat_request.timezone
-    )
+    llm_calls = start_turn_metrics()
+    conversation, user_message = await begin_turn(session, chat_request)
     
-    history = await get_chat_history(session, conversation.id, limit=20)
-    memories = await get_relevant_memories(
-        session, chat_request.user_id, conversation.id, chat_request.message, limit=1
+    # History, memory, dan chunk dokumen diambil paralel dengan embedding query yang sama
+    context = await retrieve_context(
+        chat_request.user_id, conversation.id, chat_request.message,
+        history_limit=HISTORY_FETCH_LIMIT, memory_limit=1, chunk_limit=3,
+        history_after=conversation.digest_through
     )
-    
-    # Get relevant document chunks
-    document_chunks = await get_relevant_document_chunks(
-        session, chat_request.message, limit=3
-    )
-    
-    # Prepare inputs for LangChain
-    memories_text = ""
-    if memories:
-        memories_text = "Ingat percakapan relevan ini dari masa lalu:\n" + "\n".join([f"- {mem}" for mem in memories])
-    
-    document_context = ""
-    if document_chunks:
-        document_context = "Informasi relevan dari dokumen:\n" + "\n".join([f"- {chunk}" for chunk in document_chunks])
-    
-    print(f"🔍 RAG DEBUG: Document context length: {len(document_context)}")
-    if document_context:
-        print(f"🔍 RAG DEBUG: Document context preview: {document_context[:200]}...")
-    else:
-        print("🔍 RAG DEBUG: No document context!")
-    
-    chat_history = "\n".join([f"{msg.sender_role}: {msg.content}" for msg in history])
+    prompt_context = build_prompt_context(context, chat_request, conversation, user_message)
+    prompt_context.log("PROMPT")
     
     ai_response = None
     error_msg = None
     
-    try:
-        # Use LangChain to generate response
-        ai_response = await asyncio.wait_for(
-            rag_chat_chain.arun(
-                document_context=document_context,
-                memories_text=memories_text,
-                chat_history=chat_history,
-                user_message=chat_request.message
-            ), timeout=15
-        )
-    except asyncio.TimeoutError:
-        error_msg = "AI response timeout. Please try again."
-    except Exception as e:
-        error_msg = f"AI error: {str(e)}"
+    # Pertanyaan serupa atas chunk dokumen yang sama -> pakai jawaban dari cache
+    cached_response = response_cache.lookup(chat_request.user_id, context.query_embedding, context.chunks)
+    if cached_response:
+        ai_response = cached_response
+    else:
+        try:
+            # Use LangChain to generate response
+            record_llm_call("chat")
+            ai_response = await asyncio.wait_for(
+                rag_chat_chain.arun(**prompt_context.inputs()), timeout=15
+            )
+            response_cache.store(chat_request.user_id, context.query_embedding, context.chunks, ai_response)
+        except asyncio.TimeoutError:
+            error_msg = "AI response timeout. Please try again."
+        except Exception as e:
+            error_msg = f"AI error: {str(e)}"
     
     if ai_response:
         await add_message_to_db(session, conversation.id, "assistant", ai_response, chat_request.timezone)
     else:
         ai_response = error_msg or "Unknown error."
     
-    summary = await generate_summary(session, conversation, chat_request.message)
+    # Judul percakapan dibuat di background setelah respons terkirim
+    summary = conversation.summary
+    if not has_title(conversation):
+        task_supervisor.submit(
+            "generate_title", generate_title_in_background, conversation.id, chat_request.message
+        )
     
     # Background embedding task
-    asyncio.create_task(
-        background_embedding_only(session, user_message, conversation, chat_request)
+    task_supervisor.submit(
+        "memory_embedding", background_embedding_only, user_message, conversation, chat_request
     )
+    schedule_digest(conversation, context)
+    print(f"🤖 LLM calls (foreground) turn ini: {dict(llm_calls)}")
     
     return schemas.ChatResponse(
         conversation_id=conversation.id, response=ai_response, summary=summary
@@ -500,85 +458,243 @@ async def generate_chat_response(
 
 
 # Background function for embedding only
-async def background_embedding_only(
-    _, user_message, conversation, chat_request
-):
+async def background_embedding_only(user_message, conversation, chat_request):
+    """Embed pesan user lalu titipkan ke write-behind buffer (insert bulk berkala).
+
+    Error sengaja tidak ditelan: task supervisor yang mencatat dan me-retry.
+    """
+    embedding = await make_embedding(chat_request.message)
+    memory_buffer.add(
+        message_id=user_message.id,
+        conversation_id=conversation.id,
+        user_id=chat_request.user_id,
+        content_embedding=embedding,
+    )
+
+
+async def save_truncated_answer(conversation_id: uuid.UUID, content: str, timezone: str | None):
+    # Session sendiri: session request bisa sudah ditutup atau ikut dibatalkan
     async with async_session() as session:
-        try:
-            embedding = make_embedding(chat_request.message)
-            new_memory = db.MemoryEmbedding(
-                message_id=user_message.id,
-                conversation_id=conversation.id,
-                user_id=chat_request.user_id,
-                content_embedding=embedding,
-            )
-            session.add(new_memory)
-            await session.commit()
-        except Exception as e:
-            pass
+        await add_message_to_db(
+            session, conversation_id, "assistant", content, timezone, is_truncated=True
+        )
 
 
-async def stream_chat_response(
-    session: AsyncSession, chat_request: schemas.ChatRequest
+def finish_truncated_turn(
+    user_message, conversation, chat_request: schemas.ChatRequest, partial_response: str
 ):
-    conversation = await get_or_create_conversation(
-        session, chat_request.user_id, chat_request.conversation_id
-    )
-    
-    user_message = await add_message_to_db(
-        session, conversation.id, "user", chat_request.message, chat_request.timezone
-    )
-    
-    history = await get_chat_history(session, conversation.id, limit=3)
-    memories = await get_relevant_memories(
-        session, chat_request.user_id, conversation.id, chat_request.message, limit=1
+    """Klien memutus stream: catat metrik, lalu simpan jawaban parsial (is_truncated)
+    dan memory pesan user lewat task supervisor. Tidak await, aman dipanggil
+    dari generator yang sedang dibatalkan."""
+    stream_totals["cancelled"] += 1
+    stream_totals["truncated_chars"] += len(partial_response)
+    print(f"🔌 STREAM: klien terputus, stream LLM dihentikan ({conversation.id}, {len(partial_response)} chars)")
+    save_partial_turn(user_message, conversation, chat_request, partial_response)
+
+
+def save_partial_turn(
+    user_message, conversation, chat_request: schemas.ChatRequest, partial_response: str
+):
+    """Simpan jawaban parsial (is_truncated) dan memory pesan user lewat task
+    supervisor, tanpa judul/digest. Tidak await."""
+    if partial_response:
+        task_supervisor.submit(
+            "save_truncated_answer", save_truncated_answer,
+            conversation.id, partial_response, chat_request.timezone
+        )
+    # Pesan user tetap masuk memory walau jawabannya terpotong
+    task_supervisor.submit(
+        "memory_embedding", background_embedding_only, user_message, conversation, chat_request
     )
+
+
+def replay_chunks(text: str, size: int = 64):
+    """Pecah teks di batas spasi menjadi potongan ~`size` karakter untuk di-stream ulang."""
+    start = 0
+    while start < len(text):
+        end = text.find(" ", start + size)
+        end = len(text) if end == -1 else end + 1
+        yield text[start:end]
+        start = end
+
+
+async def chat_stream_events(
+    chat_request: schemas.ChatRequest,
+    turn: tuple[db.Conversation, db.Message] | None = None,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    wait_for_title: bool = False,
+) -> AsyncIterator[tuple[str, dict]]:
+    """Satu turn chat streaming sebagai event bertipe `(event, data)`.
+
+    Event: sources, token (digabung per STREAM_FLUSH_CHARS/INTERVAL), error,
+    usage, summary (judul percakapan), lalu done. Jika `is_disconnected`
+    menyatakan klien sudah pergi, stream LLM dihentikan (tidak lanjut memakai kuota).
+
+    Tidak ada session yang dipegang selama generasi: DB hanya disentuh lewat
+    session pendek sebelum (begin_turn) dan sesudahnya (simpan jawaban).
+    """
+    started = time.perf_counter()
+    llm_calls = start_turn_metrics()
+    if turn is None:
+        async with async_session() as session:
+            turn = await begin_turn(session, chat_request)
+    conversation, user_message = turn
     
-    # Get relevant document chunks
-    document_chunks = await get_relevant_document_chunks(
-        session, chat_request.message, limit=3
+    # History, memory, dan chunk dokumen diambil paralel dengan embedding query yang sama
+    context = await retrieve_context(
+        chat_request.user_id, conversation.id, chat_request.message,
+        history_limit=HISTORY_FETCH_LIMIT, memory_limit=1, chunk_limit=3,
+        history_after=conversation.digest_through
     )
-    
-    # Prepare inputs for LangChain
-    memories_text = ""
-    if memories:
-        memories_text = "Ingat percakapan relevan ini dari masa lalu:\n" + "\n".join([f"- {mem}" for mem in memories])
-    
-    document_context = ""
-    if document_chunks:
-        document_context = "Informasi relevan dari dokumen:\n" + "\n".join([f"- {chunk}" for chunk in document_chunks])
-    
-    print(f"🔍 RAG DEBUG STREAM: Document context length: {len(document_context)}")
-    if document_context:
-        print(f"🔍 RAG DEBUG STREAM: Document context preview: {document_context[:200]}...")
-    else:
-        print("🔍 RAG DEBUG STREAM: No document context!")
-    
-    chat_history = "\n".join([f"{msg.sender_role}: {msg.content}" for msg in history])
+    prompt_context = build_prompt_context(context, chat_request, conversation, user_message)
+    prompt_context.log("PROMPT STREAM")
+    yield "sources", {
+        "chunks": [
+            {
+                "chunk_id": str(chunk.id),
+                "document_id": str(chunk.document_id),
+                "page_number": chunk.page_number,
+            }
+            for chunk in context.chunks
+        ]
+    }
     
     ai_response = ""
+    usage = None
+    first_token_at = None
+    disconnected = False
+    errored = False
+    buffer: list[str] = []
+    buffered = 0
+    last_flush = time.perf_counter()
     
+    cached_response = response_cache.lookup(chat_request.user_id, context.query_embedding, context.chunks)
+    stream_totals["started"] += 1
     try:
-        # Use LangChain streaming with RAG
-        async for chunk in llm.astream(
-            rag_chat_prompt.format_messages(
-                document_context=document_context,
-                memories_text=memories_text,
-                chat_history=chat_history,
-                user_message=chat_request.message
-            )
-        ):
-            if chunk.content:
-                ai_response += chunk.content
-                yield chunk.content
-            
+        if cached_response:
+            # Putar ulang jawaban dari cache sebagai stream
+            first_token_at = time.perf_counter()
+            for piece in replay_chunks(cached_response, size=STREAM_FLUSH_CHARS):
+                ai_response += piece
+                yield "token", {"text": piece}
+                await asyncio.sleep(0)
+        else:
+            # Use LangChain streaming with RAG; aclosing memastikan request upstream
+            # ikut ditutup saat stream berhenti lebih awal atau dibatalkan
+            record_llm_call("chat")
+            async with aclosing(llm.astream(
+                rag_chat_prompt.format_messages(**prompt_context.inputs())
+            )) as stream:
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if not chunk.content:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    ai_response += chunk.content
+                    buffer.append(chunk.content)
+                    buffered += len(chunk.content)
+                    now = time.perf_counter()
+                    # Gabungkan token kecil: lebih sedikit write/paket ke klien
+                    if buffered >= STREAM_FLUSH_CHARS or now - last_flush >= STREAM_FLUSH_INTERVAL:
+                        if is_disconnected and await is_disconnected():
+                            disconnected = True
+                            break
+                        yield "token", {"text": "".join(buffer)}
+                        buffer.clear()
+                        buffered = 0
+                        last_flush = now
+            if buffer and not disconnected:
+                yield "token", {"text": "".join(buffer)}
+            if not disconnected:
+                response_cache.store(chat_request.user_id, context.query_embedding, context.chunks, ai_response)
+    except (asyncio.CancelledError, GeneratorExit):
+        # Server membatalkan generator (koneksi ditutup di tengah write): jangan
+        # await lagi di scope yang dibatalkan, serahkan penyimpanan ke task background
+        finish_truncated_turn(user_message, conversation, chat_request, ai_response)
+        raise
     except Exception as e:
-        yield f"[STREAM ERROR] {str(e)}"
-
+        stream_totals["errors"] += 1
+        errored = True
+        yield "error", {"message": str(e)}
+
+    if disconnected:
+        finish_truncated_turn(user_message, conversation, chat_request, ai_response)
+        return
+    if errored:
+        # LLM gagal di tengah jawaban: simpan yang sudah terkirim sebagai jawaban
+        # terpotong; bukan turn selesai, jadi tanpa judul/digest/completed
+        print(f"⚠️ STREAM: LLM gagal ({conversation.id}, {len(ai_response)} chars terkirim)")
+        save_partial_turn(user_message, conversation, chat_request, ai_response)
+        return
+
+    title_task = None
     if ai_response:
-        await add_message_to_db(session, conversation.id, "assistant", ai_response, chat_request.timezone)
-        await generate_summary(session, conversation, chat_request.message)
+        async with async_session() as session:
+            await add_message_to_db(session, conversation.id, "assistant", ai_response, chat_request.timezone)
+        if not has_title(conversation):
+            title_task = task_supervisor.submit(
+                "generate_title", generate_title_in_background, conversation.id, chat_request.message
+            )
+        schedule_digest(conversation, context)
     
-    asyncio.create_task(
-        background_embedding_only(session, user_message, conversation, chat_request)
-    )
\ No newline at end of file
+    task_supervisor.submit(
+        "memory_embedding", background_embedding_only, user_message, conversation, chat_request
+    )
+    stream_totals["completed"] += 1
+    print(f"🤖 LLM calls (foreground) turn ini: {dict(llm_calls)}")
+
+    usage = usage or {}
+    yield "usage", {
+        "prompt_tokens": usage.get("input_tokens") or prompt_context.tokens["total"],
+        "completion_tokens": usage.get("output_tokens") or estimate_tokens(ai_response),
+        "estimated": not usage,
+        "cached": bool(cached_response),
+        "llm_calls": dict(llm_calls),
+        "timings": {
+            "retrieval": context.timings,
+            "first_token_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
+
+    summary = conversation.summary
+    if title_task is not None and wait_for_title:
+        # Judul dibuat di background; tunggu sebentar agar bisa dikirim di stream yang sama
+        try:
+            summary = await asyncio.wait_for(asyncio.shield(title_task), STREAM_SUMMARY_WAIT) or summary
+        except Exception:
+            pass
+    yield "summary", {"conversation_id": str(conversation.id), "summary": summary}
+    yield "done", {}
+
+
+async def stream_chat_response(
+    chat_request: schemas.ChatRequest,
+    turn: tuple[db.Conversation, db.Message] | None = None,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+):
+    """Stream text/plain (format lama): hanya teks jawaban, error ditulis inline."""
+    async for event, data in chat_stream_events(
+        chat_request, turn=turn, is_disconnected=is_disconnected
+    ):
+        if event == "token":
+            yield data["text"]
+        elif event == "error":
+            yield f"[STREAM ERROR] {data['message']}"
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_chat_sse(
+    chat_request: schemas.ChatRequest,
+    turn: tuple[db.Conversation, db.Message] | None = None,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+):
+    """Stream Server-Sent Events dengan event bertipe (lihat chat_stream_events)."""
+    async for event, data in chat_stream_events(
+        chat_request, turn=turn, is_disconnected=is_disconnected, wait_for_title=True
+    ):
+        yield format_sse(event, data)
@@ -321,10 +321,12 @@ uploadForm.onsubmit = async function(e) {
     };
     xhr.onload = async function() {
       uploadProgress.style.display = 'none';
-      if (xhr.status === 200) {
-        uploadStatus.innerHTML = '<span style="color:green;">&#10003; Upload berhasil!</span>';
+      if (xhr.status === 200 || xhr.status === 202) {
+        uploadStatus.innerHTML = '<span style="color:green;">&#10003; Upload berhasil! Dokumen sedang diproses...</span>';
         fileInput.value = '';
         document.getElementById('drop-message').textContent = 'Drag & drop PDF di sini atau klik untuk memilih file';
+        const job = JSON.parse(xhr.responseText);
+        await pollIngestionJob(job.id);
         await fetchAndRenderDocuments();
       } else {
         let msg = 'Upload gagal';
@@ -343,6 +345,45 @@ uploadForm.onsubmit = async function(e) {
   }
 };
 
+// Pantau job ingest sampai selesai (done/failed)
+const JOB_STATUS_LABELS = {
+  queued: 'Menunggu antrian',
+  parsing: 'Membaca PDF',
+  embedding: 'Membuat embedding',
+};
+
+async function pollIngestionJob(jobId) {
+  uploadProgress.style.display = 'block';
+  while (true) {
+    let job;
+    try {
+      const res = await fetch(`/api/admin/jobs/${jobId}`, {
+        headers: { 'Authorization': 'Bearer ' + localStorage.getItem('access_token') }
+      });
+      if (!res.ok) throw new Error('Gagal mengambil status job');
+      job = await res.json();
+    } catch (err) {
+      uploadProgress.style.display = 'none';
+      uploadStatus.innerHTML = '<span style="color:red;">&#10060; ' + err.message + '</span>';
+      return;
+    }
+    if (job.status === 'done') {
+      uploadProgress.style.display = 'none';
+      uploadStatus.innerHTML = `<span style="color:green;">&#10003; Dokumen selesai diproses (${job.chunks_total} chunk)</span>`;
+      return;
+    }
+    if (job.status === 'failed') {
+      uploadProgress.style.display = 'none';
+      uploadStatus.innerHTML = '<span style="color:red;">&#10060; Proses gagal: ' + (job.error || 'Unknown error') + '</span>';
+      return;
+    }
+    const percent = job.chunks_total ? Math.round((job.chunks_done / job.chunks_total) * 100) : 0;
+    progressBarFill.style.width = percent + '%';
+    uploadStatus.textContent = `${JOB_STATUS_LABELS[job.status] || job.status}... ${job.chunks_done}/${job.chunks_total} chunk`;
+    await new Promise(resolve => setTimeout(resolve, 1500));
+  }
+}
+
 // === DOKUMEN LIST ===
 async function fetchAndRenderDocuments() {
   const loading = document.getElementById('documents-loading');
@@ -18,6 +18,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- State Aplikasi ---
     let currentConversationId = null;
+    // Cursor keyset untuk halaman berikutnya (null = tidak ada lagi)
+    let conversationsCursor = null;
+    let messagesCursor = null;
+    const CONVERSATION_PAGE_SIZE = 20;
+    const MESSAGE_PAGE_SIZE = 50;
 
     // Fungsi untuk membuat conversation baru
     async function createNewConversation() {
@@ -49,6 +54,18 @@ document.addEventListener('DOMContentLoaded', () => {
      * @param {boolean} animate - Apakah akan menggunakan animasi.
      */
     function appendMessage(sender, text, animate = true) {
+        chatWindow.appendChild(createMessageElement(sender, text, animate));
+        chatWindow.scrollTop = chatWindow.scrollHeight;
+    }
+
+    /**
+     * Membuat elemen DOM untuk satu pesan (tanpa menambahkannya ke jendela chat).
+     * @param {string} sender - Peran pengirim ('user' atau 'bot').
+     * @param {string} text - Konten pesan.
+     * @param {boolean} animate - Apakah akan menggunakan animasi.
+     * @returns {HTMLElement}
+     */
+    function createMessageElement(sender, text, animate = true) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${sender} ${animate ? 'slide-up' : ''}`;
         
@@ -62,9 +79,7 @@ document.addEventListener('DOMContentLoaded', () => {
         
         messageDiv.appendChild(avatar);
         messageDiv.appendChild(bubble);
-        
-        chatWindow.appendChild(messageDiv);
-        chatWindow.scrollTop = chatWindow.scrollHeight;
+        return messageDiv;
     }
 
    /**
@@ -262,30 +277,63 @@ function escapeHtml(str) {
     // ==================================================================
 
     /**
-     * Memuat semua percakapan pengguna dari server.
+     * Membuat tombol "muat lagi" untuk pagination berbasis cursor.
+     * @param {string} label - Teks tombol.
+     * @param {Function} onClick - Aksi saat tombol diklik.
+     * @returns {HTMLElement}
      */
-    async function loadConversations() {
+    function createLoadMoreButton(label, onClick) {
+        const button = document.createElement('button');
+        button.className = 'load-more-btn';
+        button.textContent = label;
+        button.addEventListener('click', async (e) => {
+            e.stopPropagation();
+            button.disabled = true;
+            button.textContent = 'Loading...';
+            await onClick();
+            button.remove();
+        });
+        return button;
+    }
+
+    /**
+     * Memuat percakapan pengguna dari server, satu halaman per panggilan.
+     * @param {boolean} append - True untuk menambahkan halaman berikutnya, false untuk memuat ulang dari awal.
+     */
+    async function loadConversations(append = false) {
         if (!chatHistory) return;
-        chatHistory.innerHTML = '<div class="loading-placeholder">Loading conversations...</div>';
+        if (!append) {
+            conversationsCursor = null;
+            chatHistory.innerHTML = '<div class="loading-placeholder">Loading conversations...</div>';
+        }
         
         try {
-            const res = await fetch(`/conversations?user_id=${userId}`);
+            const params = new URLSearchParams({ user_id: userId, limit: CONVERSATION_PAGE_SIZE });
+            if (append && conversationsCursor) params.set('cursor', conversationsCursor);
+            const res = await fetch(`/conversations?${params}`);
             if (!res.ok) throw new Error('Failed to load conversations');
             
-            const conversations = await res.json();
-            chatHistory.innerHTML = '';
+            const page = await res.json();
+            if (!append) chatHistory.innerHTML = '';
             
-            if (conversations.length === 0) {
+            if (!append && page.items.length === 0) {
                 chatHistory.innerHTML = '<div class="empty-state">No conversations yet</div>';
                 return;
             }
             
-            conversations.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
-            conversations.forEach((conv) => {
+            // Server sudah mengurutkan terbaru dulu
+            page.items.forEach((conv) => {
                 const item = createChatItem(conv);
                 chatHistory.appendChild(item);
             });
 
+            conversationsCursor = page.next_cursor;
+            if (conversationsCursor) {
+                chatHistory.appendChild(
+                    createLoadMoreButton('Load more', () => loadConversations(true))
+                );
+            }
+
             // Aktifkan item jika cocok dengan percakapan saat ini
             if(currentConversationId) {
                 const activeItem = chatHistory.querySelector(`.chat-item[data-id="${currentConversationId}"]`);
@@ -377,6 +425,11 @@ function escapeHtml(str) {
             const data = await res.json();
             currentConversationId = data.id;
             renderMessages(data.messages);
+            // Hanya halaman pesan terbaru yang dimuat; pesan lama dimuat sesuai permintaan
+            messagesCursor = data.next_cursor;
+            if (messagesCursor) {
+                chatWindow.prepend(createLoadMoreButton('Load earlier messages', loadOlderMessages));
+            }
             
             const activeItem = document.querySelector(`.chat-item[data-id="${conversationId}"]`);
             setActiveConversation(activeItem);
@@ -388,6 +441,40 @@ function escapeHtml(str) {
         }
     }
 
+    /**
+     * Memuat halaman pesan yang lebih lama dan menyisipkannya di atas, tanpa menggeser posisi scroll.
+     */
+    async function loadOlderMessages() {
+        if (!currentConversationId || !messagesCursor) return;
+        const conversationId = currentConversationId;
+        const params = new URLSearchParams({ cursor: messagesCursor, limit: MESSAGE_PAGE_SIZE });
+        try {
+            const res = await fetch(`/conversations/${conversationId}/messages?${params}`);
+            if (!res.ok) throw new Error('Failed to load messages');
+            const page = await res.json();
+            // Percakapan sudah berganti selama request berjalan
+            if (conversationId !== currentConversationId) return;
+
+            const previousHeight = chatWindow.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            page.items.forEach((msg) => {
+                fragment.appendChild(createMessageElement(msg.sender_role, msg.content, false));
+            });
+            messagesCursor = page.next_cursor;
+            if (messagesCursor) {
+                fragment.prepend(createLoadMoreButton('Load earlier messages', loadOlderMessages));
+            }
+            const firstMessage = chatWindow.querySelector('.message');
+            chatWindow.insertBefore(fragment, firstMessage);
+            chatWindow.scrollTop += chatWindow.scrollHeight - previousHeight;
+        } catch (err) {
+            chatWindow.prepend(Object.assign(document.createElement('div'), {
+                className: 'error-state',
+                textContent: err.message,
+            }));
+        }
+    }
+
     // ==================================================================
     // LOGIKA RENAME DAN DELETE
     // ==================================================================
@@ -547,7 +634,7 @@ async function handleDelete(conversationId, itemElement) {
 
         setTimeout(() => {
             itemElement.remove();
-            if (chatHistory.children.length === 0) {
+            if (chatHistory.querySelectorAll('.chat-item').length === 0) {
                 chatHistory.innerHTML = '<div class="empty-state">No conversations yet</div>';
             }
         }, 300); // Sesuaikan dengan durasi transisi CSS
@@ -636,9 +723,9 @@ async function handleDelete(conversationId, itemElement) {
                 if(activeItem) setActiveConversation(activeItem);
             }
 
-            const response = await fetch('/chat/stream', {
+            const response = await fetch('/chat/stream?format=sse', {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
                 body: JSON.stringify({ 
                     message: userText, 
                     user_id: userId, 
@@ -654,16 +741,31 @@ async function handleDelete(conversationId, itemElement) {
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
             let aiText = '';
+            let sseBuffer = '';
+            let summary = null;
+            let streamError = null;
             
             while (true) {
                 const { done, value } = await reader.read();
                 if (done) break;
                 
-                const decodedChunk = decoder.decode(value, { stream: true }); // Decode once
-                aiText += decodedChunk;
-                console.log('Received chunk:', decodedChunk); // Tambahkan ini
-                console.log('Current aiText:', aiText); // Tambahkan ini
-                botBubble.innerHTML = formatMessage(aiText);
+                sseBuffer += decoder.decode(value, { stream: true });
+                // Satu event SSE diakhiri baris kosong
+                const blocks = sseBuffer.split('\n\n');
+                sseBuffer = blocks.pop();
+                for (const block of blocks) {
+                    const { event, data } = parseSseBlock(block);
+                    if (event === 'token') {
+                        aiText += data.text;
+                        botBubble.innerHTML = formatMessage(aiText);
+                    } else if (event === 'sources') {
+                        renderSources(botMessageDiv, data.chunks);
+                    } else if (event === 'summary') {
+                        summary = data.summary;
+                    } else if (event === 'error') {
+                        streamError = data.message;
+                    }
+                }
                 chatWindow.scrollTop = chatWindow.scrollHeight;
             }
             
@@ -671,9 +773,13 @@ async function handleDelete(conversationId, itemElement) {
             if (conversationIdHeader) {
                 currentConversationId = conversationIdHeader;
             }
+            if (streamError && !aiText) {
+                throw new Error(streamError);
+            }
             
             // Muat ulang riwayat untuk menampilkan percakapan baru
             await loadConversations();
+            if (!summary) refreshTitleLater(currentConversationId);
             
         } catch (err) {
             botBubble.innerHTML = `<span class="error-text">Sorry, I encountered an error. Please try again.</span>`;
@@ -684,6 +790,48 @@ async function handleDelete(conversationId, itemElement) {
     }
 
 
+    /**
+     * Mengurai satu blok Server-Sent Event menjadi nama event dan data JSON.
+     * @param {string} block - Baris-baris `event:`/`data:` tanpa baris kosong penutup.
+     * @returns {{event: string, data: object}}
+     */
+    function parseSseBlock(block) {
+        let event = 'message';
+        const dataLines = [];
+        for (const line of block.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+        }
+        return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+    }
+
+    /**
+     * Menampilkan halaman dokumen sumber di bawah bubble jawaban bot.
+     * @param {HTMLElement} messageDiv - Elemen pesan bot.
+     * @param {Array} chunks - Daftar {chunk_id, document_id, page_number}.
+     */
+    function renderSources(messageDiv, chunks) {
+        if (!chunks || chunks.length === 0) return;
+        const pages = [...new Set(chunks.map(chunk => chunk.page_number).filter(Boolean))];
+        const sources = document.createElement('div');
+        sources.className = 'message-sources';
+        sources.textContent = pages.length ? `Sumber: halaman ${pages.join(', ')}` : 'Sumber: dokumen';
+        messageDiv.querySelector('.message-bubble').after(sources);
+    }
+
+
+    /**
+     * Judul percakapan dibuat di background oleh server; muat ulang sidebar
+     * sekali lagi jika judulnya belum tersedia.
+     * @param {string} conversationId - ID percakapan.
+     */
+    function refreshTitleLater(conversationId, delayMs = 4000) {
+        const item = document.querySelector(`.chat-item[data-id="${conversationId}"] .chat-item-title`);
+        if (item && item.textContent.trim() !== 'New Conversation') return;
+        setTimeout(() => loadConversations(), delayMs);
+    }
+
+
     // ==================================================================
     // FUNGSI UTILITAS DAN EVENT LISTENERS
     // ==================================================================
@@ -0,0 +1,364 @@
+import os
+import re
+import uuid
+import asyncio
+from collections import Counter
+from contextvars import ContextVar
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.prompts import ChatPromptTemplate
+from langchain.chains import LLMChain
+from sqlalchemy import func, or_, update
+from sqlalchemy.future import select
+
+from . import database as db
+from .database import async_session
+from .retrieval import get_chat_history
+from .context_builder import DIGEST_TOKEN_BUDGET, HISTORY_FETCH_LIMIT, truncate_to_tokens
+
+DEFAULT_TITLE = "New Conversation"
+
+# Ringkasan berjalan: setelah DIGEST_EVERY_TURNS turn (user + assistant) di luar
+# DIGEST_KEEP_RECENT pesan terakhir, pesan lama dilipat ke Conversation.digest
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "true").lower() == "true"
+DIGEST_EVERY_TURNS = int(os.getenv("DIGEST_EVERY_TURNS", "4"))
+DIGEST_KEEP_RECENT = int(os.getenv("DIGEST_KEEP_RECENT", "6"))
+DIGEST_MAX_FOLD = 100
+DIGEST_MESSAGE_TOKEN_LIMIT = 300
+
+summary_llm = ChatGoogleGenerativeAI(
+    model=os.getenv("GEMINI_SUMMARY_MODEL", os.getenv("GEMINI_MODEL", "gemini-2.5-flash")),
+    temperature=0.3
+)
+
+
+# --- Observability: jumlah panggilan LLM per turn dan total ---
+llm_call_totals: Counter = Counter()
+turn_count = 0
+_turn_llm_calls: ContextVar[Counter | None] = ContextVar("turn_llm_calls", default=None)
+
+
+def start_turn_metrics() -> Counter:
+    """Mulai penghitung panggilan LLM untuk satu turn chat.
+
+    Task background yang dibuat setelahnya mewarisi context, jadi panggilannya
+    ikut terhitung di turn yang sama.
+    """
+    global turn_count
+    turn_count += 1
+    calls = Counter()
+    _turn_llm_calls.set(calls)
+    return calls
+
+
+def record_llm_call(kind: str):
+    llm_call_totals[kind] += 1
+    calls = _turn_llm_calls.get()
+    if calls is not None:
+        calls[kind] += 1
+
+
+def llm_call_stats() -> dict:
+    total = sum(llm_call_totals.values())
+    return {
+        "turns": turn_count,
+        "calls": dict(llm_call_totals),
+        "calls_per_turn": round(total / turn_count, 3) if turn_count else 0.0,
+    }
+
+
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", """Kamu adalah ahli dalam membuat judul yang ringkas dan informatif. Tugas kamu adalah membuat satu judul singkat (maksimal 7 kata) yang paling relevan dan mewakili konteks percakapan.
+
+Panduan:
+- Gunakan kata-kata yang spesifik dan deskriptif
+- Hindari kata-kata umum seperti "percakapan" atau "chat"
+- Fokus pada topik utama yang dibahas
+- Gunakan bahasa Indonesia yang baik
+- Jangan tambahkan tanda kutip atau format khusus
+- Hanya berikan judul saja, tanpa penjelasan tambahan
+
+Contoh judul yang baik:
+- "Cara Membuat Website dengan React"
+- "Tips Investasi Saham untuk Pemula"
+- "Resep Masakan Nusantara"
+- "Troubleshooting Laptop Lambat"
+
+Contoh judul yang kurang baik:
+- "Percakapan tentang teknologi"
+- "Chat dengan asisten"
+- "Pertanyaan dan jawaban"""),
+    ("human", "Buatkan judul untuk percakapan berikut:\n\n{chat_content}")
+])
+
+substantive_prompt = ChatPromptTemplate.from_messages([
+    ("system", """Kamu adalah sistem yang mengevaluasi apakah konten percakapan cukup substantif untuk dibuatkan ringkasan yang bermakna.
+
+Kriteria konten SUBSTANTIF (jawab 'YES'):
+- Berisi pertanyaan spesifik yang memerlukan penjelasan
+- Membahas topik atau konsep tertentu
+- Meminta saran, rekomendasi, atau bantuan teknis
+- Berisi informasi atau pengetahuan yang bisa diringkas
+- Memiliki nilai edukatif atau informatif
+
+Kriteria konten TIDAK SUBSTANTIF (jawab 'NO'):
+- Salam atau ucapan sederhana (halo, selamat pagi, dll)
+- Ucapan terima kasih tanpa konteks tambahan
+- Konfirmasi sederhana (ok, baik, setuju)
+- Emoji atau reaksi tanpa teks
+- Pesan yang terlalu pendek dan tidak informatif
+
+Instruksi:
+- Analisis konten dengan cermat
+- Pertimbangkan konteks dan nilai informatif
+- Jawab hanya dengan 'YES' atau 'NO'
+- Tidak ada penjelasan tambahan"""),
+    ("human", "Evaluasi apakah konten berikut substantif untuk dibuatkan ringkasan:\n\n{content}")
+])
+
+digest_prompt = ChatPromptTemplate.from_messages([
+    ("system", """Kamu memelihara ringkasan berjalan dari sebuah percakapan antara pengguna dan asisten AI.
+
+Panduan:
+- Gabungkan ringkasan sebelumnya dengan pesan-pesan baru menjadi satu ringkasan utuh
+- Pertahankan fakta penting: kebutuhan pengguna, keputusan, angka, nama, kode produk, dan pertanyaan yang belum terjawab
+- Buang salam, basa-basi, dan pengulangan
+- Tulis dalam bahasa Indonesia, paling banyak 200 kata
+- Hanya berikan ringkasannya saja, tanpa judul atau penjelasan tambahan"""),
+    ("human", "Ringkasan sebelumnya:\n{previous_digest}\n\nPesan baru:\n{new_messages}")
+])
+
+summary_chain = LLMChain(llm=summary_llm, prompt=summary_prompt)
+substantive_chain = LLMChain(llm=summary_llm, prompt=substantive_prompt)
+digest_chain = LLMChain(llm=summary_llm, prompt=digest_prompt)
+
+
+# --- Klasifikasi substantif: heuristik lokal dulu, LLM hanya jika ragu ---
+GREETING_LEXICON = {
+    "halo", "hallo", "hai", "hi", "hello", "hey", "hei", "pagi", "siang", "sore", "malam",
+    "selamat", "good", "morning", "evening", "night", "assalamualaikum", "salam",
+    "terima", "kasih", "makasih", "trims", "thanks", "thank", "you", "thx",
+    "ok", "oke", "okay", "okey", "baik", "sip", "siap", "ya", "iya", "yes", "no",
+    "tidak", "nggak", "gak", "setuju", "mantap", "keren", "bagus", "wow", "hehe",
+    "haha", "wkwk", "banyak", "sekali", "bye", "dadah", "sampai", "jumpa", "kak", "min", "bot",
+}
+QUESTION_WORDS = {
+    "apa", "apakah", "bagaimana", "gimana", "kenapa", "mengapa", "kapan", "dimana",
+    "berapa", "siapa", "mana", "jelaskan", "tolong", "bisakah", "cara",
+    "what", "how", "why", "when", "where", "which", "who", "explain",
+}
+
+
+def classify_substantive(content: str | None) -> bool | None:
+    """Heuristik murah (panjang, salam, kata tanya). None berarti ragu -> tanya LLM."""
+    if not content or not content.strip():
+        return False
+    words = re.findall(r"\w+", content.lower())
+    if not words:
+        return False  # emoji atau tanda baca saja
+    if all(word in GREETING_LEXICON for word in words):
+        return False
+    if len(words) >= 8:
+        return True
+    if (content.strip().endswith("?") or words[0] in QUESTION_WORDS) and len(words) >= 3:
+        return True
+    # Pesan pendek yang bukan salam (mis. "reset password", "P-00042") tetap diputuskan LLM
+    return None
+
+
+async def is_substantive_content(content: str) -> bool:
+    """Tentukan apakah konten cukup substantif untuk dibuatkan judul."""
+    verdict = classify_substantive(content)
+    if verdict is not None:
+        return verdict
+    try:
+        record_llm_call("substantive")
+        result = await asyncio.wait_for(
+            substantive_chain.arun(content=content), timeout=5
+        )
+        result = result.strip().upper()
+        return result == "YES"
+    except Exception as e:
+        return False
+
+
+def has_title(conversation) -> bool:
+    summary = (conversation.summary or "").strip()
+    return summary != "" and summary.lower() != DEFAULT_TITLE.lower()
+
+
+async def _store_title(conversation_id: uuid.UUID, title: str) -> str | None:
+    """Simpan judul dalam session pendek, kecuali judul lain sudah tersimpan selama LLM berjalan."""
+    summary = db.Conversation.summary
+    async with async_session() as session:
+        result = await session.execute(
+            update(db.Conversation)
+            .where(
+                db.Conversation.id == conversation_id,
+                or_(
+                    summary.is_(None),
+                    func.trim(summary) == "",
+                    func.lower(func.trim(summary)) == DEFAULT_TITLE.lower(),
+                ),
+            )
+            .values(summary=title)
+        )
+        await session.commit()
+        if result.rowcount == 1:
+            return title
+        return await session.scalar(select(summary).filter_by(id=conversation_id))
+
+
+async def _generate_title(conversation, user_message_content: str = None):
+    # `conversation` hanya dibaca; tidak ada session yang terbuka selama LLM dipanggil
+    # Case 2: Pesan saat ini tidak substantif -> tetap "New Conversation".
+    if user_message_content is not None and not await is_substantive_content(user_message_content):
+        if not conversation.summary or conversation.summary.strip() == "":
+            return await _store_title(conversation.id, DEFAULT_TITLE)
+        return conversation.summary
+
+    # Case 3: Buat judul dari digest + pesan terakhir (bukan seluruh riwayat).
+    try:
+        async with async_session() as session:
+            all_msgs = await get_chat_history(
+                session, conversation.id, limit=HISTORY_FETCH_LIMIT, after=conversation.digest_through
+            )
+        chat_lines = " | ".join(
+            ([f"ringkasan: {conversation.digest}"] if conversation.digest else [])
+            + [f"{msg.sender_role}: {msg.content}" for msg in all_msgs]
+        )
+
+        # Riwayat sudah pasti substantif jika pesan saat ini substantif; klasifikasi
+        # riwayat hanya diperlukan bila dipanggil tanpa pesan (endpoint summary).
+        if user_message_content is None and not await is_substantive_content(chat_lines):
+            return await _store_title(conversation.id, DEFAULT_TITLE)
+
+        # Generate summary using LangChain
+        record_llm_call("summary")
+        new_summary = await asyncio.wait_for(
+            summary_chain.arun(chat_content=chat_lines), timeout=10
+        )
+        new_summary = new_summary.strip().replace("\n", " ")
+
+        if new_summary:
+            return await _store_title(conversation.id, new_summary)
+        if not conversation.summary:
+            return await _store_title(conversation.id, DEFAULT_TITLE)
+        return conversation.summary
+
+    except Exception as e:
+        if not conversation.summary:
+            return await _store_title(conversation.id, DEFAULT_TITLE)
+        return conversation.summary
+
+
+async def generate_summary(
+    session, conversation, user_message_content: str = None
+):
+    # Case 1: A meaningful summary already exists. Tidak perlu klasifikasi sama sekali.
+    if has_title(conversation):
+        return conversation.summary
+    # Akhiri transaksi baca pemanggil agar koneksinya tidak tertahan selama LLM berjalan
+    await session.commit()
+    return await _generate_title(conversation, user_message_content)
+
+
+async def generate_title_in_background(
+    conversation_id: uuid.UUID, user_message_content: str
+) -> str | None:
+    """Buat judul percakapan setelah respons terkirim, dengan session pendek sendiri."""
+    try:
+        async with async_session() as session:
+            result = await session.execute(
+                select(db.Conversation).filter_by(id=conversation_id)
+            )
+            conversation = result.scalars().first()
+        if not conversation:
+            return None
+        if has_title(conversation):
+            return conversation.summary
+        return await _generate_title(conversation, user_message_content)
+    except Exception as e:
+        print(f"⚠️ SUMMARY: gagal membuat judul untuk {conversation_id}: {e}")
+        return None
+
+
+# --- Ringkasan berjalan (digest) ---
+_folding: set[uuid.UUID] = set()
+
+
+def digest_due(unfolded_messages: int) -> bool:
+    """True jika pesan yang belum dilipat sudah melebihi yang disimpan utuh + N turn."""
+    return DIGEST_ENABLED and unfolded_messages >= DIGEST_KEEP_RECENT + 2 * DIGEST_EVERY_TURNS
+
+
+async def fold_digest(conversation_id: uuid.UUID) -> bool:
+    """Lipat pesan lama (di luar DIGEST_KEEP_RECENT terakhir) ke Conversation.digest.
+
+    Berjalan di background. Pesan dibaca dalam session pendek yang ditutup
+    sebelum LLM dipanggil; hasilnya disimpan di session baru dan hanya berlaku
+    jika digest_through belum berubah.
+    """
+    if conversation_id in _folding:
+        return False
+    _folding.add(conversation_id)
+    try:
+        async with async_session() as session:
+            result = await session.execute(
+                select(db.Conversation).filter_by(id=conversation_id)
+            )
+            conversation = result.scalars().first()
+            if not conversation:
+                return False
+            previous_through = conversation.digest_through
+            previous_digest = conversation.digest
+
+            stmt = select(db.Message).filter_by(conversation_id=conversation_id)
+            if previous_through is not None:
+                stmt = stmt.filter(db.Message.created_at > previous_through)
+            result = await session.execute(
+                stmt.order_by(db.Message.created_at.asc(), db.Message.id.asc())
+                .limit(DIGEST_MAX_FOLD + DIGEST_KEEP_RECENT)
+            )
+            pending = result.scalars().all()
+        fold = pending[:len(pending) - DIGEST_KEEP_RECENT] if DIGEST_KEEP_RECENT else pending
+        if len(fold) < 2 * DIGEST_EVERY_TURNS:
+            return False
+
+        new_messages = "\n".join(
+            f"{msg.sender_role}: {truncate_to_tokens(msg.content, DIGEST_MESSAGE_TOKEN_LIMIT)}"
+            for msg in fold
+        )
+        record_llm_call("digest")
+        digest = await asyncio.wait_for(
+            digest_chain.arun(
+                previous_digest=previous_digest or "(belum ada)",
+                new_messages=new_messages,
+            ), timeout=20
+        )
+        digest = truncate_to_tokens(digest.strip(), DIGEST_TOKEN_BUDGET)
+        if not digest:
+            return False
+
+        async with async_session() as session:
+            result = await session.execute(
+                update(db.Conversation)
+                .where(
+                    db.Conversation.id == conversation_id,
+                    db.Conversation.digest_through.is_not_distinct_from(previous_through),
+                )
+                .values(
+                    digest=digest,
+                    digest_through=fold[-1].created_at,
+                    digest_message_count=db.Conversation.digest_message_count + len(fold),
+                )
+            )
+            await session.commit()
+        folded = result.rowcount == 1
+        print(f"🗜️ DIGEST: {conversation_id} +{len(fold)} pesan dilipat={folded}")
+        return folded
+    except Exception as e:
+        print(f"⚠️ DIGEST: gagal memperbarui digest {conversation_id}: {e}")
+        return False
+    finally:
+        _folding.discard(conversation_id)
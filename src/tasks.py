@@ -0,0 +1,164 @@
+import os
+import random
+import asyncio
+import logging
+import contextvars
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+TASK_QUEUE_SIZE = int(os.getenv("TASK_QUEUE_SIZE", "1000"))
+TASK_CONCURRENCY = int(os.getenv("TASK_CONCURRENCY", "8"))
+TASK_MAX_RETRIES = int(os.getenv("TASK_MAX_RETRIES", "2"))
+TASK_RETRY_BACKOFF = float(os.getenv("TASK_RETRY_BACKOFF", "0.5"))
+# Lama menunggu antrian habis saat shutdown sebelum sisa task dibatalkan
+TASK_DRAIN_TIMEOUT = float(os.getenv("TASK_DRAIN_TIMEOUT", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRejected(Exception):
+    """Antrian task background penuh atau supervisor sedang berhenti."""
+
+
+@dataclass
+class _Job:
+    name: str
+    fn: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    retries: int
+    future: asyncio.Future
+    # Context saat submit (mis. penghitung LLM per turn) ikut dibawa ke worker
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class TaskSupervisor:
+    """Pengganti `create_task` lepas untuk pekerjaan setelah respons terkirim.
+
+    Task masuk antrian terbatas dan dijalankan `concurrency` worker, dengan
+    retry + exponential backoff. Saat shutdown antrian dikosongkan dulu
+    (maksimal `drain_timeout` detik) sebelum worker dihentikan.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = TASK_QUEUE_SIZE,
+        concurrency: int = TASK_CONCURRENCY,
+        max_retries: int = TASK_MAX_RETRIES,
+        retry_backoff: float = TASK_RETRY_BACKOFF,
+        drain_timeout: float = TASK_DRAIN_TIMEOUT,
+    ):
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.drain_timeout = drain_timeout
+        self._queue: asyncio.Queue[_Job] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._accepting = False
+        self.running = 0
+        self.totals: Counter = Counter()
+        self.failures_by_name: Counter = Counter()
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._accepting = True
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"task-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        self._accepting = False
+        if self._queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Task background belum selesai saat shutdown: %s di antrian", self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Task yang tidak sempat jalan tidak boleh membuat penunggunya menggantung
+        while self._queue is not None and not self._queue.empty():
+            self._reject(self._queue.get_nowait(), "shutdown")
+            self._queue.task_done()
+
+    def submit(self, name: str, fn: Callable[..., Awaitable[Any]], *args, retries: int | None = None, **kwargs) -> asyncio.Future:
+        """Antrikan `fn(*args, **kwargs)`; hasilnya bisa ditunggu lewat future yang dikembalikan."""
+        job = _Job(
+            name=name, fn=fn, args=args, kwargs=kwargs,
+            retries=self.max_retries if retries is None else retries,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self.totals["submitted"] += 1
+        if not self._accepting:
+            self._reject(job, "not running")
+            return job.future
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._reject(job, "queue full")
+        return job.future
+
+    def _reject(self, job: _Job, reason: str):
+        self.totals["rejected"] += 1
+        logger.warning("Task background %s ditolak: %s", job.name, reason)
+        if not job.future.done():
+            job.future.set_exception(TaskRejected(f"{job.name}: {reason}"))
+            # Hindari warning "exception was never retrieved" bila tidak ada yang menunggu
+            job.future.exception()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self.running += 1
+            try:
+                await self._run(job)
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    async def _run(self, job: _Job):
+        attempt = 0
+        while True:
+            try:
+                task = asyncio.create_task(job.fn(*job.args, **job.kwargs), context=job.context)
+                result = await task
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                if attempt < job.retries:
+                    attempt += 1
+                    self.totals["retried"] += 1
+                    delay = self.retry_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                    logger.info("Task %s gagal (%s), retry %s dalam %.2fs", job.name, e, attempt, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                self.totals["failed"] += 1
+                self.failures_by_name[job.name] += 1
+                logger.warning("Task background %s gagal setelah %s percobaan: %s", job.name, attempt + 1, e)
+                if not job.future.done():
+                    job.future.set_exception(e)
+                    job.future.exception()
+                return
+            self.totals["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+            return
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "workers": len(self._workers),
+            **{key: self.totals[key] for key in ("submitted", "completed", "failed", "retried", "rejected")},
+            "failures_by_name": dict(self.failures_by_name),
+        }
+
+
+task_supervisor = TaskSupervisor()
@@ -0,0 +1,99 @@
+import os
+import uuid
+import hashlib
+from dataclasses import dataclass
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile, status
+from fastapi.responses import JSONResponse
+
+UPLOADS_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Kelonggaran untuk boundary dan field lain di body multipart
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """File upload melebihi MAX_UPLOAD_BYTES."""
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+async def store_upload(
+    file: UploadFile,
+    directory: str = UPLOADS_DIR,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+) -> StoredUpload:
+    """Salin upload ke disk per potongan (I/O async) sambil menghitung SHA-256.
+
+    Saat fungsi ini dipanggil parser multipart Starlette sudah menyalin body
+    ke file sementaranya sendiri, jadi `max_bytes` di sini hanya pemeriksaan
+    terakhir; upload yang terlalu besar ditolak lebih awal oleh
+    `UploadSizeLimit` dari header Content-Length. Memori yang dipakai di sini
+    hanya sebesar satu potongan. File parsial dihapus bila melebihi batas atau
+    penulisan gagal.
+    """
+    await aiofiles.os.makedirs(directory, exist_ok=True)
+    extension = os.path.splitext(file.filename or "")[1].lower() or ".pdf"
+    path = os.path.join(directory, f"{uuid.uuid4()}{extension}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await file.read(chunk_bytes):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File melebihi batas {max_bytes} bytes")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        await discard_upload(path)
+        raise
+    return StoredUpload(path=path, size=size, sha256=digest.hexdigest())
+
+
+class UploadSizeLimit:
+    """Middleware ASGI: tolak upload di `paths` sebelum body-nya dibaca.
+
+    Content-Length di atas batas -> 413; tanpa Content-Length (chunked) -> 411,
+    karena ukurannya baru diketahui setelah seluruh body ter-spool ke disk.
+    """
+
+    def __init__(self, app, paths: set[str], max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = paths
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            length = dict(scope["headers"]).get(b"content-length")
+            response = None
+            if length is None or not length.isdigit():
+                response = JSONResponse(
+                    status_code=status.HTTP_411_LENGTH_REQUIRED,
+                    content={"detail": "Content-Length wajib untuk upload"},
+                )
+            elif int(length) > self.max_bytes + MULTIPART_OVERHEAD_BYTES:
+                response = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": f"File melebihi batas {self.max_bytes} bytes"},
+                )
+            if response is not None:
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+async def discard_upload(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass